@@ -1,19 +1,25 @@
+import gc
+import os
 import time
 import json
+import subprocess
+import sys
+import tracemalloc
+from functools import partial
+
+import numpy as np
+from sympy import ImmutableDenseMatrix, Symbol, symbols, lambdify, Derivative, Dummy
 
 from benchmark.utils import clear_sympy_cache, warm_up_function
+from benchmark.instrumentation import OperationCounter
+from benchmark.profiling import profile_function
+from benchmark.metrics import expression_metrics, dag_metrics, jacobian_metrics
+from benchmark import registry
+from benchmark.cache_study import IMPLEMENTATIONS as CACHE_IMPLEMENTATIONS, MODES as CACHE_MODES
+from benchmark.cache_study import time_in_subprocess
 from benchmark.models import generate_input_pendulum, generate_input_bicycle, setup_bicycle, linearize_and_validate
+from benchmark.models import generate_input_pendulum_matrices, generate_input_chain, bicycle_parameters
 
-from implementations.forward_jacobian_sdm import forward_jacobian_sdm
-from implementations.forward_jacobian_sdm_non_exraw import forward_jacobian_sdm_non_exraw
-from implementations.forward_jacobian_ric2 import forward_jacobian_ric2
-from implementations.forward_jacobian_ric3 import forward_jacobian_ric3
-from implementations.forward_jacobian_ric4 import forward_jacobian_ric4
-from implementations.forward_jacobian_final import forward_jacobian
-from implementations.forward_jacobian_sam import forward_jacobian_sam
-from implementations.jacobian_classic import jacobian_classic
-from implementations.jacobian_protosym import jacobian_protosym
-from implementations.jacobian_symengine import jacobian_symengine
 
 
 def time_function(func, *args, **kwargs):
@@ -28,6 +34,81 @@ def time_function(func, *args, **kwargs):
     return elapsed_time, result
 
 
+def memory_function(func, *args, **kwargs):
+    """
+    Measures the peak memory allocated during the execution of a given function.
+    """
+
+    tracemalloc.start()
+    try:
+        result = func(*args, **kwargs)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak_memory, result
+
+
+class GCMonitor:
+    """
+    Records the number of garbage collections of each generation and the time spent
+    in them, through ``gc.callbacks``.
+    """
+
+    def __init__(self):
+        self.collections = [0, 0, 0]
+        self.time = 0.0
+        self._start = None
+
+    def __call__(self, phase, info):
+        if phase == 'start':
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            self.time += time.perf_counter() - self._start
+            self.collections[info['generation']] += 1
+            self._start = None
+
+    def __enter__(self):
+        gc.callbacks.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        gc.callbacks.remove(self)
+        return False
+
+
+def pin_to_cpu(cpu):
+    """
+    Pins the current process to the given CPU and returns the previous affinity, or
+    None where CPU affinity is not supported.
+    """
+
+    if not hasattr(os, 'sched_setaffinity'):
+        return None
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, {cpu})
+    return previous
+
+
+def time_function_gc(func, *args, disable_gc=False, **kwargs):
+    """
+    Times the execution of a given function after a full collection, reporting the
+    garbage collections happening during the execution separately. If ``disable_gc``
+    is True, the garbage collector is disabled during the execution.
+    """
+
+    gc.collect()
+    enabled = gc.isenabled()
+    with GCMonitor() as monitor:
+        if disable_gc:
+            gc.disable()
+        try:
+            elapsed_time, result = time_function(func, *args, **kwargs)
+        finally:
+            if enabled:
+                gc.enable()
+    return elapsed_time, monitor, result
+
+
 def save_results_to_json(data, filename='data/results_pendulum.json'):
     """
     Save benchmark results to a JSON file.
@@ -45,26 +126,37 @@ def save_results_to_json(data, filename='data/results_pendulum.json'):
         json.dump(results, f, indent=4)
 
 
-def run_benchmark_pendulum(num_runs=10, sizes=tuple(range(1, 5))):
+def count_function(func, *args, **kwargs):
+    """
+    Counts the symbolic primitives called during the execution of a given function.
+    """
+
+    with OperationCounter() as counter:
+        result = func(*args, **kwargs)
+    return counter.as_dict(), result
+
+
+def run_benchmark_pendulum(num_runs=10, sizes=tuple(range(1, 5)), instrument=True, profile=False,
+                           sampling=False, implementations=None, workers=None,
+                           filename='data/results_pendulum.json'):
     """
     Benchmark different Jacobian implementations using the given number of runs and input sizes.
+    If ``instrument`` is True, the symbolic primitives called by each implementation are
+    counted on a separate run and recorded with the results. If ``profile`` is True, each
+    implementation and size is also profiled, see ``profile_function``.
+
+    ``implementations`` is a list of names from the registry, ``registry.DEFAULT`` by
+    default, and ``workers`` is passed on to the implementations supporting it.
     """
 
-    implementations = {
-        'jacobian_classic': jacobian_classic,
-        'forward_jacobian_sdm': forward_jacobian_sdm,
-        #'forward_jacobian_ric2': forward_jacobian_ric2,
-        #'forward_jacobian_ric3': forward_jacobian_ric3,
-        #'forward_jacobian_ric4': forward_jacobian_ric4,
-        'forward_jacobian_sdm_non_exraw': forward_jacobian_sdm_non_exraw,
-        'forward_jacobian_final': forward_jacobian,
-        #'forward_jacobian_sam': forward_jacobian_sam,
-        #'jacobian_protosym': jacobian_protosym,
-        #'jacobian_symengine': jacobian_symengine
-    }
+    if num_runs < 1:
+        raise ValueError("``num_runs`` must be at least 1")
+
+    implementations = registry.load(implementations or registry.DEFAULT, workers=workers)
 
     for size in sizes:
         expr, wrt = generate_input_pendulum(size)
+        input_metrics = {**expression_metrics(expr, 'input'), **dag_metrics(expr)}
 
         for name, func in implementations.items():
             clear_sympy_cache()
@@ -79,39 +171,62 @@ def run_benchmark_pendulum(num_runs=10, sizes=tuple(range(1, 5))):
             # Average the results
             avg_total_time = sum(sub_times['total']) / num_runs
 
+            # Peak memory is measured on a separate run, tracing slows down execution.
+            # The size metrics are computed on the Jacobian of that run
+            clear_sympy_cache()
+            peak_memory, J = memory_function(func, expr, wrt)
+
+            # The size of a DAG output is the one of the Jacobian in DAG form
+            if registry.REGISTRY[name].dag_output:
+                _, J = J
+
             # Save results
             data = {
                 'implementation': name,
+                'model': 'pendulum',
+                'workers': registry.REGISTRY[name].workers(workers),
                 'input_size': len(expr),
                 'wrt_size': len(wrt),
-                'total_time': avg_total_time
+                'total_time': avg_total_time,
+                'times': sub_times['total'],
+                'peak_memory': peak_memory,
+                **input_metrics,
+                **jacobian_metrics(J, avg_total_time, input_metrics['dag_nodes'])
             }
 
-            save_results_to_json(data)
-            print(f"{name} - Input Size: {len(expr)}, Total Time: {avg_total_time}, Sub Times: {sub_times}")
+            if instrument:
+                clear_sympy_cache()
+                data['operations'], _ = count_function(func, expr, wrt)
+
+            if profile:
+                clear_sympy_cache()
+                profile_function(func, expr, wrt, sampling=sampling,
+                                 path=f'data/profiles/pendulum_{name}_{len(expr)}')
+
+            save_results_to_json(data, filename=filename)
+            print(f"{name} - Input Size: {len(expr)}, Total Time: {avg_total_time}, "
+                  f"Peak Memory: {peak_memory}, Sub Times: {sub_times}")
 
 
-def run_benchmark_bicycle(num_runs=10):
+BICYCLE_DEFAULT = ['jacobian_classic', 'forward_jacobian_sdm', 'forward_jacobian_sdm_non_exraw',
+                   'forward_jacobian_final', 'forward_jacobian_final_spill',
+                   'forward_jacobian_final_parallel', 'forward_jacobian_columns']
+
+
+def run_benchmark_bicycle(num_runs=10, profile=False, sampling=False, implementations=None,
+                          workers=None, filename='data/results_bicycle.json'):
     """
     Benchmark different Jacobian implementations using the given number of runs and input sizes.
+    If ``profile`` is True, each implementation is also profiled, see ``profile_function``.
     """
 
-    implementations = {
-        'jacobian_classic': jacobian_classic,
-        'forward_jacobian_sdm': forward_jacobian_sdm,
-        'forward_jacobian_sdm_non_exraw': forward_jacobian_sdm_non_exraw,
-        #'forward_jacobian_ric2': forward_jacobian_ric2,
-        #'forward_jacobian_ric3': forward_jacobian_ric3,
-        #'forward_jacobian_ric4': forward_jacobian_ric4,
-        'forward_jacobian_final': forward_jacobian,
-
-        #'forward_jacobian_sam': forward_jacobian_sam,
-        #'jacobian_protosym': jacobian_protosym,
-        #'jacobian_symengine': jacobian_symengine
-    }
+    if num_runs < 1:
+        raise ValueError("``num_runs`` must be at least 1")
 
+    implementations = registry.load(implementations or BICYCLE_DEFAULT, workers=workers)
 
     expr, wrt = generate_input_bicycle()
+    input_metrics = {**expression_metrics(expr, 'input'), **dag_metrics(expr)}
 
     for name, func in implementations.items():
         clear_sympy_cache()
@@ -126,37 +241,57 @@ def run_benchmark_bicycle(num_runs=10):
         # Average the results
         avg_total_time = sum(sub_times['total']) / num_runs
 
+        # Peak memory is measured on a separate run, tracing slows down execution.
+        # The size metrics are computed on the Jacobian of that run
+        clear_sympy_cache()
+        peak_memory, J = memory_function(func, expr, wrt)
+
+        # The size of a DAG output is the one of the Jacobian in DAG form
+        if registry.REGISTRY[name].dag_output:
+            _, J = J
+
+        if profile:
+            clear_sympy_cache()
+            profile_function(func, expr, wrt, sampling=sampling,
+                             path=f'data/profiles/bicycle_{name}')
+
         # Save results
         data = {
             'implementation': name,
+            'model': 'bicycle',
+            'workers': registry.REGISTRY[name].workers(workers),
             'input_size': len(expr),
             'wrt_size': len(wrt),
-            'total_time': avg_total_time
+            'total_time': avg_total_time,
+            'times': sub_times['total'],
+            'peak_memory': peak_memory,
+            **input_metrics,
+            **jacobian_metrics(J, avg_total_time, input_metrics['dag_nodes'])
         }
 
-        save_results_to_json(data, filename='data/results_bicycle.json')
-        print(f"{name} - Input Size: {len(expr)}, Total Time: {avg_total_time}, Sub Times: {sub_times}")
+        save_results_to_json(data, filename=filename)
+        print(f"{name} - Input Size: {len(expr)}, Total Time: {avg_total_time}, "
+              f"Peak Memory: {peak_memory}, Sub Times: {sub_times}")
 
 
-def run_benchmark_linearize(num_runs=10):
+LINEARIZE_DEFAULT = ['forward_jacobian_final', 'jacobian_classic', 'forward_jacobian_sdm',
+                     'forward_jacobian_sdm_non_exraw', 'forward_jacobian_columns']
+
+
+def run_benchmark_linearize(num_runs=10, implementations=None, workers=None,
+                            filename='data/results_bicycle_linearization.json'):
     """
     Benchmark different Jacobian implementations using the given number of runs and input sizes.
     """
 
-    implementations = {
-        #'forward_jacobian_ric': forward_jacobian_ric,
-        'jacobian_final': forward_jacobian,
-        'jacobian_classic': jacobian_classic,
-        'forward_jacobian_sdm': forward_jacobian_sdm,
-        'forward_jacobian_sdm_non_exraw': forward_jacobian_sdm_non_exraw,
-    }
+    implementations = registry.load(implementations or LINEARIZE_DEFAULT, workers=workers)
 
     for name, func in implementations.items():
 
         KM, fr, frstar, method = setup_bicycle(method=func)
 
         def linearization():
-            return linearize_and_validate(KM)
+            return linearize_and_validate(KM, method)
 
         clear_sympy_cache()
         #warm_up_function(linearization)  # Warm up the function
@@ -173,8 +308,733 @@ def run_benchmark_linearize(num_runs=10):
         # Save results
         data = {
             'implementation': name,
-            'total_time': avg_total_time
+            'model': 'bicycle_linearization',
+            'workers': registry.REGISTRY[name].workers(workers),
+            'total_time': avg_total_time,
+            'times': sub_times['total']
         }
 
-        save_results_to_json(data, filename='data/results_bicycle_linearization.json')
+        save_results_to_json(data, filename=filename)
         print(f"{name}, Total Time: {avg_total_time}, Sub Times: {sub_times}")
+
+
+def run_benchmark_linearize_params(num_runs=10, workers=None,
+                                   filename='data/results_bicycle_linearization_params.json'):
+    """
+    Benchmark the linearization of the bicycle with the numeric parameters folded into
+    the Jacobian DAGs before accumulation, so that only the speed ``v`` (introduced
+    at the operating point) stays symbolic.
+    """
+
+    forward_jacobian = registry.REGISTRY['forward_jacobian_final'].load(workers)
+
+    implementations = {
+        'jacobian_final': forward_jacobian,
+        'jacobian_final_params': partial(forward_jacobian, params=bicycle_parameters()),
+    }
+
+    for name, func in implementations.items():
+
+        KM, fr, frstar, method = setup_bicycle(method=func)
+
+        def linearization():
+            return linearize_and_validate(KM, method)
+
+        sub_times = {'total': []}
+        for _ in range(num_runs):
+            clear_sympy_cache()
+            total_time, _ = time_function(linearization)
+            sub_times['total'].append(total_time)
+
+        # Average the results
+        avg_total_time = sum(sub_times['total']) / num_runs
+
+        # Save results
+        data = {
+            'implementation': name,
+            'model': 'bicycle_linearization',
+            'workers': registry.REGISTRY['forward_jacobian_final'].workers(workers),
+            'total_time': avg_total_time,
+            'times': sub_times['total']
+        }
+
+        save_results_to_json(data, filename=filename)
+        print(f"{name}, Total Time: {avg_total_time}, Sub Times: {sub_times}")
+
+
+def run_benchmark_sweep(num_points=(10, 100, 1000, 10000), num_subs=20):
+    """
+    Benchmark the evaluation of the linearized bicycle over a sweep of speeds ``v``,
+    comparing the compiled sweep (with batched eigenvalues) with substituting each
+    speed symbolically.
+    """
+
+    from implementations.forward_jacobian_final import forward_jacobian
+    from implementations.linearization_sweep import linearization_sweep
+
+    KM, fr, frstar, method = setup_bicycle(method=forward_jacobian)
+    A, B = linearize_and_validate(KM, method)
+    v = symbols('v')
+
+    # Symbolic substitution one speed at a time, timed on a few speeds only
+    clear_sympy_cache()
+    subs_time, _ = time_function(lambda: [np.linalg.eigvals(np.array(A.subs(v, x), dtype=float))
+                                          for x in np.linspace(0, 10, num_subs)])
+    subs_rate = num_subs / subs_time
+
+    clear_sympy_cache()
+    build_time, sweep = time_function(linearization_sweep, A, B, v)
+
+    for N in num_points:
+        speeds = np.linspace(0, 10, N)
+        eval_time, _ = time_function(sweep, speeds, eigenvalues=True)
+
+        # Save results
+        data = {
+            'implementation': 'linearization_sweep',
+            'num_points': N,
+            'build_time': build_time,
+            'eval_time': eval_time,
+            'points_per_second': N / eval_time,
+            'subs_points_per_second': subs_rate
+        }
+
+        save_results_to_json(data, filename='data/results_sweep.json')
+        print(f"linearization_sweep - Points: {N}, Build Time: {build_time}, "
+              f"Points/s: {N / eval_time}, Subs Points/s: {subs_rate}")
+
+
+def run_benchmark_cache(num_runs=5, sizes=tuple(range(1, 5)),
+                        cache_sizes=(0, 100, 1000, 10000, 'none')):
+    """
+    Benchmark how much each implementation depends on the SymPy cache. Each
+    implementation is timed in fresh subprocesses in the cold, cleared and warm modes
+    with the default cache, and then in the cleared mode over a sweep of
+    ``SYMPY_CACHE_SIZE`` values and with the cache disabled.
+    """
+
+    settings = [(mode, None, True) for mode in CACHE_MODES]
+    settings += [('cleared', cache_size, True) for cache_size in cache_sizes]
+    settings += [('cleared', None, False)]
+
+    for size in sizes:
+        for name in CACHE_IMPLEMENTATIONS:
+            for mode, cache_size, use_cache in settings:
+                times = time_in_subprocess(name, size, mode, num_runs,
+                                           cache_size=cache_size, use_cache=use_cache)
+
+                # Average the results
+                avg_total_time = sum(times) / len(times)
+
+                # Save results
+                data = {
+                    'implementation': name,
+                    'size': size,
+                    'mode': mode,
+                    'cache_size': 'default' if cache_size is None else cache_size,
+                    'use_cache': use_cache,
+                    'total_time': avg_total_time,
+                    'times': times
+                }
+
+                save_results_to_json(data, filename='data/results_cache.json')
+                print(f"{name} - Size: {size}, Mode: {mode}, Cache Size: {data['cache_size']}, "
+                      f"Use Cache: {use_cache}, Total Time: {avg_total_time}")
+
+
+def run_benchmark_low_noise(num_runs=10, sizes=tuple(range(1, 5)), cpu=0,
+                            implementations=('jacobian_classic', 'forward_jacobian_sdm',
+                                             'forward_jacobian_final')):
+    """
+    Benchmark the Jacobian implementations pinned to one CPU, separating the time spent
+    in garbage collection from the algorithmic cost, and comparing the timings and the
+    peak memory with the garbage collector disabled.
+    """
+
+    implementations = registry.load(implementations)
+
+    affinity = pin_to_cpu(cpu)
+
+    try:
+        for size in sizes:
+            expr, wrt = generate_input_pendulum(size)
+
+            for name, func in implementations.items():
+                clear_sympy_cache()
+                warm_up_function(func, expr, wrt)  # Warm up the function
+
+                sub_times = {'total': [], 'gc': [], 'gc_disabled': []}
+                collections = [0, 0, 0]
+                for _ in range(num_runs):
+                    clear_sympy_cache()
+                    total_time, monitor, _ = time_function_gc(func, expr, wrt)
+                    sub_times['total'].append(total_time)
+                    sub_times['gc'].append(monitor.time)
+                    collections = [c + n for c, n in zip(collections, monitor.collections)]
+
+                    clear_sympy_cache()
+                    total_time, _, _ = time_function_gc(func, expr, wrt, disable_gc=True)
+                    sub_times['gc_disabled'].append(total_time)
+
+                # Average the results
+                avg_total_time = sum(sub_times['total']) / num_runs
+                avg_gc_time = sum(sub_times['gc']) / num_runs
+                avg_gc_disabled_time = sum(sub_times['gc_disabled']) / num_runs
+
+                # Peak memory is measured on separate runs, tracing slows down execution
+                clear_sympy_cache()
+                peak_memory, _ = memory_function(func, expr, wrt)
+                clear_sympy_cache()
+                gc.disable()
+                try:
+                    peak_memory_gc_disabled, _ = memory_function(func, expr, wrt)
+                finally:
+                    gc.enable()
+
+                # Save results
+                data = {
+                    'implementation': name,
+                    'model': 'pendulum',
+                    'input_size': len(expr),
+                    'wrt_size': len(wrt),
+                    'cpu': cpu if affinity is not None else None,
+                    'total_time': avg_total_time,
+                    'gc_time': avg_gc_time,
+                    'algorithmic_time': avg_total_time - avg_gc_time,
+                    'gc_collections': collections,
+                    'gc_disabled_time': avg_gc_disabled_time,
+                    'peak_memory': peak_memory,
+                    'peak_memory_gc_disabled': peak_memory_gc_disabled,
+                    'times': sub_times
+                }
+
+                save_results_to_json(data, filename='data/results_low_noise.json')
+                print(f"{name} - Input Size: {len(expr)}, Total Time: {avg_total_time}, "
+                      f"GC Time: {avg_gc_time}, GC Disabled Time: {avg_gc_disabled_time}, "
+                      f"Peak Memory: {peak_memory}, Peak Memory GC Disabled: {peak_memory_gc_disabled}")
+    finally:
+        if affinity is not None:
+            os.sched_setaffinity(0, affinity)
+
+
+def run_benchmark_import(num_runs=5, filename='data/results_import.json'):
+    """
+    Benchmark the import time of the harness and of each registered implementation,
+    every import running in a fresh subprocess.
+    """
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    modules = ['benchmark.registry', 'benchmark.benchmark']
+    modules += list(dict.fromkeys(impl.target.split(':')[0] for impl in registry.REGISTRY.values()))
+
+    code = ("import time; start = time.perf_counter(); import {}; "
+            "print(time.perf_counter() - start)")
+
+    for module in modules:
+        times = []
+        for _ in range(num_runs):
+            output = subprocess.run([sys.executable, '-c', code.format(module)], cwd=root,
+                                    capture_output=True, text=True)
+            if output.returncode != 0:
+                break
+            times.append(float(output.stdout.splitlines()[-1]))
+
+        if not times:
+            print(f"{module} - Import failed: {output.stderr.strip().splitlines()[-1]}")
+            continue
+
+        # Average the results
+        avg_total_time = sum(times) / len(times)
+
+        # Save results
+        data = {
+            'module': module,
+            'total_time': avg_total_time,
+            'times': times
+        }
+
+        save_results_to_json(data, filename=filename)
+        print(f"{module} - Import Time: {avg_total_time}")
+
+
+def run_benchmark_blocks(num_runs=10, sizes=tuple(range(1, 5))):
+    """
+    Benchmark the block decomposition of the pendulum model against the plain forward
+    Jacobian, recording how much work the decomposition avoids.
+    """
+
+    from implementations.forward_jacobian_final import forward_jacobian
+    from implementations.forward_jacobian_blocks import forward_jacobian_blocks
+
+    for size in sizes:
+        expr, wrt = generate_input_pendulum(size)
+        _, stats = forward_jacobian_blocks(expr, wrt, return_stats=True)
+
+        implementations = {
+            'forward_jacobian_final': forward_jacobian,
+            'forward_jacobian_blocks': forward_jacobian_blocks,
+            'forward_jacobian_blocks_parallel': partial(forward_jacobian_blocks, workers=os.cpu_count()),
+        }
+
+        for name, func in implementations.items():
+            clear_sympy_cache()
+            warm_up_function(func, expr, wrt)  # Warm up the function
+
+            sub_times = {'total': []}
+            for _ in range(num_runs):
+                clear_sympy_cache()
+                total_time, _ = time_function(func, expr, wrt)
+                sub_times['total'].append(total_time)
+
+            # Average the results
+            avg_total_time = sum(sub_times['total']) / num_runs
+
+            # Save results
+            data = {
+                'implementation': name,
+                'input_size': len(expr),
+                'wrt_size': len(wrt),
+                'total_time': avg_total_time,
+                'blocks': stats['blocks'],
+                'dense_work': stats['dense_work'],
+                'block_work': stats['block_work'],
+                'avoided_work': stats['avoided_work']
+            }
+
+            save_results_to_json(data, filename='data/results_blocks.json')
+            print(f"{name} - Input Size: {len(expr)}, Total Time: {avg_total_time}, "
+                  f"Blocks: {stats['blocks']}, Avoided Work: {stats['avoided_work']:.1%}")
+
+
+def run_benchmark_elimination(num_runs=10, sizes=tuple(range(1, 5))):
+    """
+    Benchmark vertex elimination orders on the pendulum model, recording the number of
+    symbolic multiplications of each order next to the forward and reverse counts.
+    """
+
+    from implementations.jacobian_vertex_elimination import jacobian_vertex_elimination
+
+    for size in sizes:
+        expr, wrt = generate_input_pendulum(size)
+
+        for order in ('forward', 'reverse', 'markowitz'):
+            func = partial(jacobian_vertex_elimination, order=order)
+            _, counts = func(expr, wrt, return_counts=True)
+
+            clear_sympy_cache()
+            warm_up_function(func, expr, wrt)  # Warm up the function
+
+            sub_times = {'total': []}
+            for _ in range(num_runs):
+                clear_sympy_cache()
+                total_time, _ = time_function(func, expr, wrt)
+                sub_times['total'].append(total_time)
+
+            # Average the results
+            avg_total_time = sum(sub_times['total']) / num_runs
+
+            # Save results
+            data = {
+                'implementation': f'jacobian_vertex_elimination_{order}',
+                'input_size': len(expr),
+                'wrt_size': len(wrt),
+                'total_time': avg_total_time,
+                'multiplications': counts[order],
+                'forward_multiplications': counts['forward'],
+                'reverse_multiplications': counts['reverse']
+            }
+
+            save_results_to_json(data, filename='data/results_elimination.json')
+            print(f"{order} - Input Size: {len(expr)}, Total Time: {avg_total_time}, "
+                  f"Multiplications: {counts[order]} (forward {counts['forward']}, reverse {counts['reverse']})")
+
+
+def run_benchmark_products(num_runs=10, sizes=tuple(range(1, 5))):
+    """
+    Benchmark Jacobian-vector and vector-Jacobian products against forming the full
+    Jacobian with forward_jacobian and multiplying.
+    """
+
+    from implementations.forward_jacobian_final import forward_jacobian
+    from implementations.jacobian_products import jvp, vjp
+
+    for size in sizes:
+        expr, wrt = generate_input_pendulum(size)
+        v = ImmutableDenseMatrix(symbols(f'v0:{len(wrt)}'))
+        w = ImmutableDenseMatrix(symbols(f'w0:{len(expr)}'))
+
+        implementations = {
+            'jvp': lambda: jvp(expr, wrt, v),
+            'forward_jacobian_times_v': lambda: forward_jacobian(expr, wrt) * v,
+            'vjp': lambda: vjp(expr, wrt, w),
+            'w_times_forward_jacobian': lambda: w.T * forward_jacobian(expr, wrt),
+        }
+
+        for name, func in implementations.items():
+            clear_sympy_cache()
+            warm_up_function(func)  # Warm up the function
+
+            sub_times = {'total': []}
+            for _ in range(num_runs):
+                clear_sympy_cache()
+                total_time, _ = time_function(func)
+                sub_times['total'].append(total_time)
+
+            # Average the results
+            avg_total_time = sum(sub_times['total']) / num_runs
+
+            # Save results
+            data = {
+                'implementation': name,
+                'input_size': len(expr),
+                'wrt_size': len(wrt),
+                'total_time': avg_total_time
+            }
+
+            save_results_to_json(data, filename='data/results_products.json')
+            print(f"{name} - Input Size: {len(expr)}, Total Time: {avg_total_time}")
+
+
+def nested_forward_hessians(expr, wrt):
+    """
+    Hessians of every element of expr computed by calling forward_jacobian on the
+    output of forward_jacobian, the approach forward_hessians is compared against.
+    """
+
+    from implementations.forward_jacobian_final import forward_jacobian
+
+    J = forward_jacobian(expr, wrt)
+    H = forward_jacobian(ImmutableDenseMatrix(J.reshape(len(J), 1)), wrt)
+    return [H[i * len(wrt):(i + 1) * len(wrt), :] for i in range(len(expr))]
+
+
+def run_benchmark_hessian(num_runs=10, sizes=tuple(range(1, 4))):
+    """
+    Benchmark forward_hessians against nesting two forward_jacobian calls on the
+    pendulum model.
+    """
+
+    from implementations.forward_hessian import forward_hessians
+
+    implementations = {
+        'forward_hessians': forward_hessians,
+        'nested_forward_jacobian': nested_forward_hessians,
+    }
+
+    for size in sizes:
+        expr, wrt = generate_input_pendulum(size)
+
+        for name, func in implementations.items():
+            clear_sympy_cache()
+            warm_up_function(func, expr, wrt)  # Warm up the function
+
+            sub_times = {'total': []}
+            for _ in range(num_runs):
+                clear_sympy_cache()
+                total_time, _ = time_function(func, expr, wrt)
+                sub_times['total'].append(total_time)
+
+            # Average the results
+            avg_total_time = sum(sub_times['total']) / num_runs
+
+            # Save results
+            data = {
+                'implementation': name,
+                'input_size': len(expr),
+                'wrt_size': len(wrt),
+                'total_time': avg_total_time
+            }
+
+            save_results_to_json(data, filename='data/results_hessian.json')
+            print(f"{name} - Input Size: {len(expr)}, Total Time: {avg_total_time}")
+
+
+def run_benchmark_multi(num_runs=10, sizes=tuple(range(1, 5))):
+    """
+    Benchmark differentiating the mass matrix and forcing vector of the pendulum model
+    with a single forward_jacobians call against one forward_jacobian call per matrix.
+    """
+
+    from implementations.forward_jacobian_final import forward_jacobian, forward_jacobians
+
+    implementations = {
+        'forward_jacobians': forward_jacobians,
+        'forward_jacobian_per_matrix': lambda exprs, wrt: [forward_jacobian(e, wrt) for e in exprs],
+    }
+
+    for size in sizes:
+        exprs, wrt = generate_input_pendulum_matrices(size)
+        input_size = sum(len(e) for e in exprs)
+
+        for name, func in implementations.items():
+            clear_sympy_cache()
+            warm_up_function(func, exprs, wrt)  # Warm up the function
+
+            sub_times = {'total': []}
+            for _ in range(num_runs):
+                clear_sympy_cache()
+                total_time, _ = time_function(func, exprs, wrt)
+                sub_times['total'].append(total_time)
+
+            # Average the results
+            avg_total_time = sum(sub_times['total']) / num_runs
+
+            # Save results
+            data = {
+                'implementation': name,
+                'input_size': input_size,
+                'wrt_size': len(wrt),
+                'total_time': avg_total_time
+            }
+
+            save_results_to_json(data, filename='data/results_multi.json')
+            print(f"{name} - Input Size: {input_size}, Total Time: {avg_total_time}")
+
+
+def small_problems(size, batch_size, shared_wrt=False):
+    """
+    Returns a batch of small pendulum problems. By default the symbols of every
+    problem are renamed, so that the problems are independent. With ``shared_wrt``
+    the problems keep the same variables and only differ by a parameter scaling
+    their expression.
+    """
+
+    expr, wrt = generate_input_pendulum(size)
+    free = sorted(expr.free_symbols | set(wrt), key=str)
+
+    problems = []
+    for k in range(batch_size):
+        if shared_wrt:
+            problems.append((expr * Symbol(f'k_{k}'), wrt))
+        else:
+            renaming = {s: Symbol(f'{s}_{k}') for s in free}
+            problems.append((expr.xreplace(renaming), wrt.xreplace(renaming)))
+
+    return problems
+
+
+def run_benchmark_many(num_runs=5, sizes=(1, 2), batch_sizes=(10, 100, 1000)):
+    """
+    Benchmark the throughput of many small Jacobians, comparing forward_jacobian_many
+    against one call per problem. The per-call overhead of each implementation is
+    measured on a batch of the smallest possible problem.
+    """
+
+    from implementations.forward_jacobian_final import forward_jacobian, forward_jacobian_many
+    from implementations.jacobian_classic import jacobian_classic
+
+    implementations = {
+        'forward_jacobian_loop': lambda problems: [forward_jacobian(e, w) for e, w in problems],
+        'forward_jacobian_many': forward_jacobian_many,
+        'jacobian_classic_loop': lambda problems: [jacobian_classic(e, w) for e, w in problems],
+    }
+
+    x = Symbol('x')
+    trivial = [(ImmutableDenseMatrix([x]), [x])] * 1000
+
+    # Times of the loop over forward_jacobian, which runs first
+    loop_times = {}
+
+    for name, func in implementations.items():
+        clear_sympy_cache()
+        warm_up_function(func, trivial[:10])  # Warm up the function
+        overhead_time, _ = time_function(func, trivial)
+        overhead = overhead_time / len(trivial)
+        print(f"{name} - Per-call overhead: {overhead}")
+
+        for model, shared_wrt in (('pendulum', False), ('pendulum_shared_wrt', True)):
+            for size in sizes:
+                for batch_size in batch_sizes:
+                    problems = small_problems(size, batch_size, shared_wrt=shared_wrt)
+
+                    times = []
+                    for _ in range(num_runs):
+                        clear_sympy_cache()
+                        total_time, _ = time_function(func, problems)
+                        times.append(total_time)
+
+                    # Average the results
+                    avg_total_time = sum(times) / num_runs
+                    loop_time = loop_times.setdefault((model, size, batch_size), avg_total_time)
+
+                    # Save results
+                    data = {
+                        'implementation': name,
+                        'model': model,
+                        'input_size': len(problems[0][0]),
+                        'batch_size': batch_size,
+                        'total_time': avg_total_time,
+                        'times': times,
+                        'jacobians_per_second': batch_size / avg_total_time,
+                        'per_call_overhead': overhead,
+                        'speedup_over_loop': loop_time / avg_total_time,
+                    }
+
+                    save_results_to_json(data, filename='data/results_many.json')
+                    print(f"{name} - {model}, Input Size: {len(problems[0][0])}, "
+                          f"Batch Size: {batch_size}, Jacobians/s: {batch_size / avg_total_time}, "
+                          f"Speed-up over loop: {loop_time / avg_total_time}")
+
+
+def run_benchmark_output(num_runs=5, sizes=(50, 100, 200, 400)):
+    """
+    Benchmark the output containers of forward_jacobian on a chain of equations, whose
+    Jacobian is large and mostly zero, recording the time and the peak memory of each.
+    """
+
+    from implementations.forward_jacobian_final import forward_jacobian, OUTPUTS
+
+    for size in sizes:
+        expr, wrt = generate_input_chain(size)
+
+        for output in (None, *OUTPUTS):
+            name = f'forward_jacobian_{output or "default"}'
+            func = partial(forward_jacobian, output=output)
+
+            clear_sympy_cache()
+            warm_up_function(func, expr, wrt)  # Warm up the function
+
+            times = []
+            for _ in range(num_runs):
+                clear_sympy_cache()
+                total_time, _ = time_function(func, expr, wrt)
+                times.append(total_time)
+
+            # Average the results
+            avg_total_time = sum(times) / num_runs
+
+            # Peak memory is measured on a separate run, tracing slows down execution
+            clear_sympy_cache()
+            peak_memory, _ = memory_function(func, expr, wrt)
+
+            # Save results
+            data = {
+                'implementation': name,
+                'model': 'chain',
+                'input_size': len(expr),
+                'wrt_size': len(wrt),
+                'total_time': avg_total_time,
+                'times': times,
+                'peak_memory': peak_memory,
+            }
+
+            save_results_to_json(data, filename='data/results_output.json')
+            print(f"{name} - Input Size: {len(expr)}, Total Time: {avg_total_time}, "
+                  f"Peak Memory: {peak_memory}")
+
+
+def run_benchmark_sdm_domains(num_runs=10, sizes=tuple(range(1, 6))):
+    """
+    Benchmark forward_jacobian_sdm with the sparse products in the EXRAW domain
+    against the polynomial ring and fraction field domains.
+    """
+
+    run_benchmark_pendulum(num_runs=num_runs, sizes=sizes, instrument=False,
+                           implementations=['forward_jacobian_sdm', 'forward_jacobian_sdm_poly',
+                                            'forward_jacobian_sdm_frac'],
+                           filename='data/results_sdm_domains.json')
+
+
+def run_benchmark_session(sizes=tuple(range(1, 5))):
+    """
+    Benchmark incremental updates of a JacobianSession on the pendulum model against
+    recomputing the Jacobian from scratch with forward_jacobian after each change.
+    """
+
+    from implementations.forward_jacobian_final import forward_jacobian
+    from implementations.jacobian_session import JacobianSession
+
+    for size in sizes:
+        expr, wrt = generate_input_pendulum(size)
+        n_states = 2 * (size + 1)
+
+        clear_sympy_cache()
+        session = JacobianSession(expr, wrt[:n_states])
+        session.jacobian()
+
+        # Append the parameters to wrt, then change a single equation
+        session.add_wrt(wrt[n_states:])
+        session.jacobian()
+        new_expr = ImmutableDenseMatrix([2 * expr[0], *expr[1:]])
+        session.replace_output(0, new_expr[0])
+        session.jacobian()
+
+        clear_sympy_cache()
+        scratch_time, _ = time_function(forward_jacobian, new_expr, wrt)
+
+        for operation, elapsed in session.timings:
+            data = {
+                'implementation': 'jacobian_session',
+                'operation': operation,
+                'input_size': len(expr),
+                'wrt_size': len(wrt),
+                'total_time': elapsed,
+                'scratch_time': scratch_time
+            }
+
+            save_results_to_json(data, filename='data/results_session.json')
+            print(f"{operation} - Input Size: {len(expr)}, Update Time: {elapsed}, "
+                  f"From Scratch: {scratch_time}")
+
+
+def lambdify_expanded_jacobian(expr, wrt, args):
+    """
+    Evaluator of the expanded output of forward_jacobian compiled with lambdify, the
+    route lambdify_jacobian is compared against. The generated function returns a
+    nested list, so the states are evaluated one at a time.
+    """
+
+    from implementations.forward_jacobian_final import forward_jacobian
+
+    J = forward_jacobian(expr, wrt)
+    dummies = {a: Dummy() for a in args if not a.is_Symbol}
+    func = lambdify([dummies.get(a, a) for a in args], J.xreplace(dummies))
+
+    def evaluate(states):
+        return np.array([func(*state) for state in states], dtype=float)
+
+    return evaluate
+
+
+def run_benchmark_numeric(num_states=10000, sizes=tuple(range(1, 5))):
+    """
+    Benchmark the numeric evaluation of the pendulum Jacobian at many states, comparing
+    the evaluator compiled from the DAG form and the dual number forward mode with
+    lambdify of the expanded Jacobian.
+    """
+
+    from implementations.jacobian_lambdify import lambdify_jacobian
+    from implementations.jacobian_dual import dual_jacobian
+
+    implementations = {
+        'lambdify_jacobian': lambdify_jacobian,
+        'dual_jacobian': dual_jacobian,
+        'lambdify_forward_jacobian': lambdify_expanded_jacobian,
+    }
+
+    rng = np.random.default_rng()
+
+    for size in sizes:
+        expr, wrt = generate_input_pendulum(size)
+        args = [*wrt, *sorted(expr.atoms(Derivative), key=str)]
+        states = rng.random((num_states, len(args)))
+
+        for name, build in implementations.items():
+            clear_sympy_cache()
+            build_time, evaluate = time_function(build, expr, wrt, args=args)
+            eval_time, _ = time_function(evaluate, states)
+
+            # Save results
+            data = {
+                'implementation': name,
+                'input_size': len(expr),
+                'wrt_size': len(wrt),
+                'num_states': num_states,
+                'build_time': build_time,
+                'eval_time': eval_time,
+                'states_per_second': num_states / eval_time
+            }
+
+            save_results_to_json(data, filename='data/results_numeric.json')
+            print(f"{name} - Input Size: {len(expr)}, Build Time: {build_time}, "
+                  f"States/s: {num_states / eval_time}")
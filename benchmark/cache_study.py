@@ -0,0 +1,87 @@
+"""Timing of the Jacobian implementations under different SymPy cache settings.
+
+The SymPy cache is configured from the ``SYMPY_USE_CACHE`` and ``SYMPY_CACHE_SIZE``
+environment variables when SymPy is imported, so every setting is timed in a fresh
+subprocess running this module::
+
+    python -m benchmark.cache_study <implementation> <size> <mode> <num_runs>
+
+which prints the list of timings as JSON on its last line of output.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from benchmark import registry
+from benchmark.utils import clear_sympy_cache, warm_up_function
+
+
+# Implementations are loaded from the registry by name in the subprocesses
+IMPLEMENTATIONS = ['jacobian_classic', 'forward_jacobian_sdm', 'forward_jacobian_final']
+
+# cold: first call in a fresh process, cleared: the cache is cleared before every
+# run after a warm up, warm: the cache is kept across the runs after a warm up
+MODES = ('cold', 'cleared', 'warm')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_in_process(name, size, mode, num_runs):
+    """
+    Times an implementation on the pendulum of the given size in this process, and
+    returns the list of timings.
+    """
+
+    from benchmark.benchmark import time_function
+    from benchmark.models import generate_input_pendulum
+
+    func = registry.REGISTRY[name].load()
+    expr, wrt = generate_input_pendulum(size)
+
+    if mode == 'cold':
+        clear_sympy_cache()
+        total_time, _ = time_function(func, expr, wrt)
+        return [total_time]
+
+    clear_sympy_cache()
+    warm_up_function(func, expr, wrt)
+
+    times = []
+    for _ in range(num_runs):
+        if mode == 'cleared':
+            clear_sympy_cache()
+        total_time, _ = time_function(func, expr, wrt)
+        times.append(total_time)
+
+    return times
+
+
+def time_in_subprocess(name, size, mode, num_runs, cache_size=None, use_cache=True):
+    """
+    Times an implementation in fresh subprocesses with the given cache settings. In
+    the cold mode every run gets its own process.
+
+    ``cache_size`` is the maximum number of entries of each cached function, with
+    ``'none'`` for an unbounded cache. By default SymPy's own default is used.
+    """
+
+    env = dict(os.environ, SYMPY_USE_CACHE='yes' if use_cache else 'no')
+    if cache_size is not None:
+        env['SYMPY_CACHE_SIZE'] = str(cache_size)
+
+    def run(runs):
+        command = [sys.executable, '-m', 'benchmark.cache_study', name, str(size), mode, str(runs)]
+        output = subprocess.run(command, env=env, cwd=ROOT, capture_output=True, text=True,
+                                check=True)
+        return json.loads(output.stdout.splitlines()[-1])
+
+    if mode == 'cold':
+        return [t for _ in range(num_runs) for t in run(1)]
+    return run(num_runs)
+
+
+if __name__ == '__main__':
+    name, size, mode, num_runs = sys.argv[1:]
+    print(json.dumps(time_in_process(name, int(size), mode, int(num_runs))))
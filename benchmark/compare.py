@@ -0,0 +1,135 @@
+"""Comparison of a benchmark run against a stored baseline.
+
+Usage::
+
+    python -m benchmark.compare baseline.json new.json [--threshold 0.1] [--alpha 0.05]
+
+Records of the two results files are matched by implementation, model, input size
+and number of worker processes, and a table of speed-ups, slow-downs and memory deltas is printed. The exit
+code is 1 when a statistically significant slow-down larger than the threshold is
+found.
+"""
+
+import argparse
+import json
+import sys
+from itertools import combinations
+from math import comb
+
+import numpy as np
+
+
+def _key(record):
+    # Runs with different numbers of workers measure different things, so they don't match
+    return (record['implementation'], record.get('model'),
+            record.get('input_size', record.get('size')), record.get('workers'))
+
+
+def load_records(filename):
+    """
+    Loads a results file into a dictionary of records keyed by implementation, model,
+    input size and number of workers. When a key appears several times, the last record wins.
+    """
+
+    with open(filename, 'r') as f:
+        return {_key(record): record for record in json.load(f)}
+
+
+def _times(record):
+    times = record.get('times', [record['total_time']])
+    return times['total'] if isinstance(times, dict) else times
+
+
+def permutation_test(a, b, max_permutations=10000, seed=0):
+    """
+    Two-sided permutation test of the difference between the means of the samples
+    ``a`` and ``b``. All the splits are enumerated when there are at most
+    ``max_permutations`` of them, which gives the exact p-value as the observed
+    split is one of them. Otherwise random splits are drawn and the observed split
+    is added to them, so that the p-value, ``(count + 1) / (n + 1)``, is never zero.
+    Returns the p-value.
+    """
+
+    pooled = np.concatenate([a, b])
+    n, observed = len(a), abs(np.mean(a) - np.mean(b))
+    if len(pooled) < 3:
+        return 1.0
+
+    exhaustive = comb(len(pooled), n) <= max_permutations
+    if exhaustive:
+        splits = (list(c) for c in combinations(range(len(pooled)), n))
+    else:
+        rng = np.random.default_rng(seed)
+        splits = (rng.permutation(len(pooled))[:n] for _ in range(max_permutations))
+
+    # The random splits are completed with the observed one
+    total, extreme = (0, 0) if exhaustive else (1, 1)
+    for split in splits:
+        mask = np.zeros(len(pooled), dtype=bool)
+        mask[split] = True
+        total += 1
+        extreme += abs(pooled[mask].mean() - pooled[~mask].mean()) >= observed - 1e-15
+
+    return extreme / total
+
+
+def compare(baseline, new, threshold=0.1, alpha=0.05):
+    """
+    Compares the matching records of two runs. Returns the rows of the comparison
+    and whether a regression was found, i.e. a significant slow-down of more than
+    ``threshold`` (relative).
+    """
+
+    rows, regression = [], False
+
+    for key in sorted(baseline.keys() & new.keys(), key=str):
+        a, b = np.array(_times(baseline[key]), dtype=float), np.array(_times(new[key]), dtype=float)
+        speedup = a.mean() / b.mean()
+        p_value = permutation_test(a, b)
+
+        status = '~'
+        if p_value < alpha:
+            status = 'faster' if speedup > 1 else 'slower'
+            if 1 / speedup - 1 > threshold:
+                status = 'REGRESSION'
+                regression = True
+
+        memory = [record.get('peak_memory') for record in (baseline[key], new[key])]
+        memory_delta = memory[1] - memory[0] if None not in memory else None
+
+        rows.append((*key, a.mean(), b.mean(), speedup, p_value, memory_delta, status))
+
+    return rows, regression
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare a benchmark run against a baseline.")
+    parser.add_argument('baseline', help="results file of the baseline run")
+    parser.add_argument('new', help="results file of the new run")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="relative slow-down above which a significant change is a regression")
+    parser.add_argument('--alpha', type=float, default=0.05, help="significance level")
+    args = parser.parse_args(argv)
+
+    baseline, new = load_records(args.baseline), load_records(args.new)
+    rows, regression = compare(baseline, new, threshold=args.threshold, alpha=args.alpha)
+
+    header = ('implementation', 'model', 'size', 'workers', 'baseline', 'new', 'speed-up',
+              'p-value', 'memory delta', 'status')
+    print(f"{header[0]:<34} {header[1]:<10} {header[2]:>5} {header[3]:>7} {header[4]:>10} "
+          f"{header[5]:>10} {header[6]:>9} {header[7]:>8} {header[8]:>13} {header[9]}")
+    for name, model, size, workers, base, current, speedup, p_value, memory_delta, status in rows:
+        memory_delta = '' if memory_delta is None else f"{memory_delta:+d}"
+        print(f"{name:<34} {str(model):<10} {str(size):>5} {str(workers):>7} {base:10.4f} "
+              f"{current:10.4f} {speedup:8.2f}x {p_value:8.3f} {memory_delta:>13} {status}")
+
+    unmatched = baseline.keys() ^ new.keys()
+    if unmatched:
+        print(f"{len(unmatched)} records without a match (e.g. run with other numbers of "
+              f"workers) were skipped")
+
+    return 1 if regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""Counting of the symbolic primitives called by the Jacobian implementations."""
+
+import sys
+import time
+from collections import defaultdict
+from functools import wraps
+
+from sympy import Basic, Add, Mul, MatrixBase
+from sympy.matrices.repmatrix import MutableRepMatrix
+from sympy.matrices.immutable import ImmutableRepMatrix
+from sympy.simplify import cse_main
+
+
+def _subclasses(cls):
+    """
+    All the subclasses of ``cls`` defined so far, ``cls`` included.
+    """
+
+    seen, stack = {cls}, [cls]
+    while stack:
+        for sub in stack.pop().__subclasses__():
+            if sub not in seen:
+                seen.add(sub)
+                stack.append(sub)
+    return seen
+
+
+class OperationCounter:
+    """
+    Context manager counting the calls to the symbolic primitives and the time
+    spent in them.
+
+    Explanation
+    ===========
+
+    Within the context, ``diff``, ``xreplace``, ``free_symbols``, the construction
+    of ``Add`` and ``Mul``, ``cse`` and the construction of ``Matrix`` and
+    ``SparseMatrix`` objects (mutable or immutable) are wrapped. Each call is
+    counted, and the time is accumulated over the outermost calls only, so that
+    nested calls of the same primitive (e.g. ``diff`` recursing into the arguments)
+    are not counted twice.
+
+    Once the SymPy cache has been cleared, the counts depend on the algorithm and
+    not on the machine, so unlike timings they can be compared across machines (up
+    to small variations due to hash ordering). Work done in worker processes is
+    not seen.
+
+    Examples
+    ========
+
+    >>> from sympy import Matrix, sin, symbols
+    >>> from implementations.forward_jacobian_final import forward_jacobian
+    >>> x, y = symbols('x y')
+    >>> with OperationCounter() as counter:
+    ...     J = forward_jacobian(Matrix([sin(x*y), x*y + 1]), [x, y])
+    >>> counter.counts['cse']['calls']
+    1
+
+    """
+
+    def __init__(self):
+        self.counts = defaultdict(lambda: {'calls': 0, 'time': 0.0})
+        self._depth = defaultdict(int)
+        self._patches = []
+
+    def _wrap(self, name, func):
+        counts, depth = self.counts[name], self._depth
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            counts['calls'] += 1
+            if depth[name]:
+                return func(*args, **kwargs)
+            depth[name] += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                counts['time'] += time.perf_counter() - start
+                depth[name] -= 1
+
+        return wrapper
+
+    def _patch(self, owner, attr, value):
+        previous = owner.__dict__.get(attr, None), attr in owner.__dict__
+        setattr(owner, attr, value)
+        self._patches.append((owner, attr, *previous))
+
+    def _patch_methods(self, name, classes, attr):
+        for cls in classes:
+            if attr in cls.__dict__:
+                self._patch(cls, attr, self._wrap(name, cls.__dict__[attr]))
+
+    def _patch_new(self, name, cls):
+        self._patch(cls, '__new__', staticmethod(self._wrap(name, cls.__new__)))
+
+    def __enter__(self):
+        basics = _subclasses(Basic) | _subclasses(MatrixBase)
+
+        self._patch_methods('diff', basics, 'diff')
+        self._patch_methods('xreplace', basics, 'xreplace')
+
+        # Classes whose metaclass also defines free_symbols (FunctionClass) can't be
+        # patched, their instances are only counted through the nested calls
+        for cls in basics:
+            prop = cls.__dict__.get('free_symbols')
+            if isinstance(prop, property) and 'free_symbols' not in type(cls).__dict__:
+                self._patch(cls, 'free_symbols', property(self._wrap('free_symbols', prop.fget)))
+
+        self._patch_new('Add', Add)
+        self._patch_new('Mul', Mul)
+        self._patch_new('Matrix', MutableRepMatrix)
+        self._patch_new('Matrix', ImmutableRepMatrix)
+
+        # cse is mostly imported by name, so every module holding it is patched
+        cse = cse_main.cse
+        wrapped = self._wrap('cse', cse)
+        for module in list(sys.modules.values()):
+            if getattr(module, 'cse', None) is cse:
+                self._patch(module, 'cse', wrapped)
+
+        return self
+
+    def __exit__(self, *exc):
+        for owner, attr, value, present in reversed(self._patches):
+            if present:
+                setattr(owner, attr, value)
+            else:
+                delattr(owner, attr)
+        self._patches = []
+        return False
+
+    def as_dict(self):
+        """
+        The counts as a plain dictionary, sorted by primitive name.
+        """
+
+        return {name: dict(count) for name, count in sorted(self.counts.items())}
@@ -0,0 +1,71 @@
+"""Expression size metrics recorded alongside the benchmark timings."""
+
+from sympy import count_ops, cse, preorder_traversal
+
+
+def tree_size(expr):
+    """
+    Number of nodes of the expression tree of each element of ``expr``, summed.
+    Repeated subexpressions are counted every time they appear.
+    """
+
+    return sum(sum(1 for _ in preorder_traversal(e)) for e in expr)
+
+
+def dag_size(expr):
+    """
+    Number of distinct nodes of the expression trees of the elements of ``expr``, i.e.
+    the size of their DAG with every repeated subexpression counted once.
+    """
+
+    seen = set()
+    stack = [e for e in expr]
+    while stack:
+        node = stack.pop()
+        if node not in seen:
+            seen.add(node)
+            stack.extend(node.args)
+    return len(seen)
+
+
+def expression_metrics(expr, prefix):
+    """
+    Returns the operation count and the tree size of the matrix ``expr``, with keys
+    starting with ``prefix``.
+    """
+
+    return {
+        f'{prefix}_count_ops': sum(count_ops(e) for e in expr),
+        f'{prefix}_nodes': tree_size(expr),
+    }
+
+
+def dag_metrics(expr):
+    """
+    Returns the size of the DAG of the matrix ``expr`` found by ``cse``: the number
+    of replacements and the total number of nodes, in which every replacement
+    symbol counts as a single leaf.
+    """
+
+    replacements, reduced = cse(expr)
+
+    return {
+        'cse_replacements': len(replacements),
+        'dag_nodes': tree_size([sub_expr for _, sub_expr in replacements]) + tree_size(reduced[0]),
+    }
+
+
+def jacobian_metrics(J, total_time, dag_nodes):
+    """
+    Returns the size metrics of the Jacobian ``J``, together with the derived throughput
+    in DAG nodes of the input differentiated per second. Besides the tree size, the
+    size of the DAG of ``J`` is given, as expanded Jacobians repeat most of their
+    subexpressions.
+    """
+
+    return {
+        'jacobian_nnz': sum(1 for e in J if e != 0),
+        **expression_metrics(J, 'output'),
+        'output_dag_nodes': dag_size(J),
+        'dag_nodes_per_second': dag_nodes / total_time,
+    }
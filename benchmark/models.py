@@ -1,7 +1,8 @@
+from contextlib import contextmanager
 
 from sympy.core.symbol import symbols
 from sympy.physics.mechanics.models import n_link_pendulum_on_cart
-from sympy import ImmutableDenseMatrix, Symbol, Function, Derivative
+from sympy import ImmutableDenseMatrix, MatrixBase, Symbol, Function, Derivative
 
 from sympy.core.numbers import pi
 from sympy.core.symbol import symbols
@@ -11,7 +12,15 @@ from sympy.matrices.dense import Matrix
 from sympy.physics.mechanics import (ReferenceFrame, dynamicsymbols,
                                       inertia, Point, RigidBody,
                                      dot)
-from benchmark.kane import KanesMethod
+
+try:
+    # KanesMethod patched to take the Jacobian implementation as ``jacobian_func``
+    from benchmark.kane import KanesMethod
+    PATCHED_KANE = True
+except ImportError:
+    from sympy.physics.mechanics import KanesMethod
+    PATCHED_KANE = False
+
 from implementations.forward_jacobian_final import forward_jacobian
 
 
@@ -44,6 +53,43 @@ def generate_input_pendulum(n):
     return expr, wrt
 
 
+def generate_input_pendulum_matrices(n):
+    """
+    Use the n_link_pendulum_on_cart model from sympy to generate the mass matrix and
+    the forcing vector of the system, which are built from the same kinematics, and
+    the variables with respect to which to differentiate them.
+    """
+
+    sys_kane = n_link_pendulum_on_cart(n, cart_force=True, joint_torques=False)
+    sys_kane.kanes_equations()
+
+    coordinates = sys_kane.q
+    speeds = sys_kane.u
+    wrt = ImmutableDenseMatrix([*speeds, *coordinates])
+
+    # Substitute dynamicsymbols with regular symbols for consistency
+    new_symbols = {symbol: Symbol(f'f{i + 1}') for i, symbol in enumerate(wrt)}
+    exprs = [ImmutableDenseMatrix(sys_kane.mass_matrix).subs(new_symbols),
+             ImmutableDenseMatrix(sys_kane.forcing).subs(new_symbols)]
+    wrt = wrt.subs(new_symbols)
+
+    return exprs, wrt
+
+
+def generate_input_chain(n):
+    """
+    Generate a chain of n equations, each coupling a variable to the next one through
+    shared trigonometric subexpressions. The Jacobian is n by n and bidiagonal, which
+    makes it a large and mostly zero output for a cheap differentiation.
+    """
+
+    y = symbols(f'y0:{n + 1}')
+    expr = ImmutableDenseMatrix([sin(y[i]) * cos(y[i + 1]) + sin(y[i]) ** 2 for i in range(n)])
+    wrt = ImmutableDenseMatrix(y[:n])
+
+    return expr, wrt
+
+
 def generate_input_bicycle():
     """
     # Code to get equations of motion for a bicycle modeled as in:
@@ -247,6 +293,40 @@ def derivative_example():
     return expr, wrt
 
 
+@contextmanager
+def jacobian_method(method):
+    """
+    Context manager making ``Matrix.jacobian`` use ``method`` within the block, for
+    the KanesMethod from SymPy which has no ``jacobian_func`` option. Jacobians
+    requested by ``method`` itself use the original implementation. Does nothing
+    when ``method`` is None.
+    """
+
+    if method is None:
+        yield
+        return
+
+    original = MatrixBase.jacobian
+    active = False
+
+    def jacobian(self, X):
+        nonlocal active
+        if active:
+            return original(self, X)
+
+        active = True
+        try:
+            return method(self, X)
+        finally:
+            active = False
+
+    MatrixBase.jacobian = jacobian
+    try:
+        yield
+    finally:
+        MatrixBase.jacobian = original
+
+
 def setup_bicycle(method=forward_jacobian):
     # Coordinates & Speeds
     q1, q2, q4, q5 = dynamicsymbols('q1 q2 q4 q5')
@@ -328,25 +408,27 @@ def setup_bicycle(method=forward_jacobian):
           (WR_mc, -mwr * g * Y.z)]
     BL = [BodyFrame, BodyFork, BodyWR, BodyWF]
 
-    # KanesMethod
-    KM = KanesMethod(N, q_ind=[q1, q2, q5],
-                     q_dependent=[q4], configuration_constraints=conlist_coord,
-                     u_ind=[u2, u3, u5],
-                     u_dependent=[u1, u4, u6], velocity_constraints=conlist_speed,
-                     kd_eqs=kd,
-                     constraint_solver="CRAMER",
-                     jacobian_func=method)
-    (fr, frstar) = KM.kanes_equations(BL, FL)
+    # KanesMethod, the one from SymPy uses ``method`` through ``jacobian_method``
+    kwargs = {'jacobian_func': method} if PATCHED_KANE else {}
+    with jacobian_method(None if PATCHED_KANE else method):
+        KM = KanesMethod(N, q_ind=[q1, q2, q5],
+                         q_dependent=[q4], configuration_constraints=conlist_coord,
+                         u_ind=[u2, u3, u5],
+                         u_dependent=[u1, u4, u6], velocity_constraints=conlist_speed,
+                         kd_eqs=kd,
+                         constraint_solver="CRAMER",
+                         **kwargs)
+        (fr, frstar) = KM.kanes_equations(BL, FL)
 
     return KM, fr, frstar, method
 
 
 from sympy import symbols, Matrix, pi, sin, cos, sqrt, acos
 
-def linearize_and_validate(KM):
-    # Define dynamicsymbols
-    q1, q2, q4, q5 = dynamicsymbols('q1 q2 q4 q5')
-    u1, u2, u3, u4, u5, u6 = dynamicsymbols('u1 u2 u3 u4 u5 u6')
+def bicycle_parameters():
+    """
+    Numerical values of the parameters of the bicycle model, from the benchmark paper.
+    """
 
     # System's Parameters
     WFrad, WRrad, htangle, forkoffset = symbols('WFrad WRrad htangle forkoffset')
@@ -378,34 +460,53 @@ def linearize_and_validate(KM):
     ForkCGNorm = (rake+(tempc * sin(pi/2-HTA-acos(tempa/tempc)))).evalf()
     ForkCGPar = (tempc * cos((pi/2-HTA)-acos(tempa/tempc))-PaperForkL).evalf()
 
+    return {WFrad: PaperRadFront,
+            WRrad: PaperRadRear,
+            htangle: HTA,
+            forkoffset: rake,
+            forklength: PaperForkL,
+            framelength: FrameLength,
+            forkcg1: ForkCGPar,
+            forkcg3: ForkCGNorm,
+            framecg1: FrameCGNorm,
+            framecg3: FrameCGPar,
+            Iwr11: 0.0603,
+            Iwr22: 0.12,
+            Iwf11: 0.1405,
+            Iwf22: 0.28,
+            Ifork11: 0.05892,
+            Ifork22: 0.06,
+            Ifork33: 0.00708,
+            Ifork31: 0.00756,
+            Iframe11: 9.2,
+            Iframe22: 11,
+            Iframe33: 2.8,
+            Iframe31: -2.4,
+            mfork: 4,
+            mframe: 85,
+            mwf: 3,
+            mwr: 2,
+            g: 9.81}
+
+
+def linearize_and_validate(KM, method=None):
+    """
+    Linearizes the bicycle about its upright, constant speed operating point, and
+    checks the result against the benchmark paper. ``method`` is the Jacobian
+    implementation used by the KanesMethod from SymPy, see ``jacobian_method``.
+    """
+
+    # Define dynamicsymbols
+    q1, q2, q4, q5 = dynamicsymbols('q1 q2 q4 q5')
+    u1, u2, u3, u4, u5, u6 = dynamicsymbols('u1 u2 u3 u4 u5 u6')
+
+    WFrad, WRrad = symbols('WFrad WRrad')
+    params = bicycle_parameters()
+    PaperRadRear = params[WRrad]
+    PaperRadFront = params[WFrad]
+
     v = symbols('v')
-    val_dict = {WFrad: PaperRadFront,
-                WRrad: PaperRadRear,
-                htangle: HTA,
-                forkoffset: rake,
-                forklength: PaperForkL,
-                framelength: FrameLength,
-                forkcg1: ForkCGPar,
-                forkcg3: ForkCGNorm,
-                framecg1: FrameCGNorm,
-                framecg3: FrameCGPar,
-                Iwr11: 0.0603,
-                Iwr22: 0.12,
-                Iwf11: 0.1405,
-                Iwf22: 0.28,
-                Ifork11: 0.05892,
-                Ifork22: 0.06,
-                Ifork33: 0.00708,
-                Ifork31: 0.00756,
-                Iframe11: 9.2,
-                Iframe22: 11,
-                Iframe33: 2.8,
-                Iframe31: -2.4,
-                mfork: 4,
-                mframe: 85,
-                mwf: 3,
-                mwr: 2,
-                g: 9.81,
+    val_dict = {**params,
                 q1: 0,
                 q2: 0,
                 q4: 0,
@@ -417,34 +518,35 @@ def linearize_and_validate(KM):
                 u5: 0,
                 u6: v / PaperRadFront}
 
-    A, B, _ = KM.linearize(
-        A_and_B=True,
-        op_point={
-            u1.diff(): 0,
-            u2.diff(): 0,
-            u3.diff(): 0,
-            u4.diff(): 0,
-            u5.diff(): 0,
-            u6.diff(): 0,
-            u1: 0,
-            u2: 0,
-            u3: v / PaperRadRear,
-            u4: 0,
-            u5: 0,
-            u6: v / PaperRadFront,
-            q1: 0,
-            q2: 0,
-            q4: 0,
-            q5: 0,
-        },
-        linear_solver="CRAMER"
-    )
+    with jacobian_method(None if PATCHED_KANE else method):
+        A, B, _ = KM.linearize(
+            A_and_B=True,
+            op_point={
+                u1.diff(): 0,
+                u2.diff(): 0,
+                u3.diff(): 0,
+                u4.diff(): 0,
+                u5.diff(): 0,
+                u6.diff(): 0,
+                u1: 0,
+                u2: 0,
+                u3: v / PaperRadRear,
+                u4: 0,
+                u5: 0,
+                u6: v / PaperRadFront,
+                q1: 0,
+                q2: 0,
+                q4: 0,
+                q5: 0,
+            },
+            linear_solver="CRAMER"
+        )
 
     A_s = A.xreplace(val_dict)
     B_s = B.xreplace(val_dict)
 
     A_s = A_s.evalf()
-    B_s = A_s.evalf()
+    B_s = B_s.evalf()
 
     A = A_s.extract([1, 2, 3, 5], [1, 2, 3, 5])
 
@@ -458,3 +560,5 @@ def linearize_and_validate(KM):
         error = Res.subs(v, i) - A.subs(v, i)
         assert all(abs(x) < eps for x in error)
 
+    return A_s, B_s
+
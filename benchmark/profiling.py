@@ -0,0 +1,96 @@
+"""Profiler capture and hot-function reports for the benchmark runs."""
+
+import cProfile
+import io
+import os
+import pstats
+import signal
+from collections import Counter
+
+
+# Primitives whose cumulative time is summarised at the top of each report
+PRIMITIVES = ('cse', 'diff', 'xreplace', 'subs', 'free_symbols')
+
+
+class _Sampler:
+    """
+    Low-overhead sampling profiler, recording the Python stack of the main thread
+    every ``interval`` seconds of CPU time through ``SIGPROF``.
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.stacks = Counter()
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return self
+
+    def __exit__(self, *exc):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._handler)
+        return False
+
+
+def hot_function_report(stats, limit=30):
+    """
+    Returns a text report of a profile, with the cumulative time of the main
+    symbolic primitives followed by the functions ranked by internal time.
+    """
+
+    out = io.StringIO()
+
+    # Recursive primitives appear once per implementing class, the largest
+    # cumulative time is the one of the outermost calls
+    out.write("Cumulative time of the symbolic primitives\n")
+    total = stats.total_tt
+    for name in PRIMITIVES:
+        ct = max((v[3] for k, v in stats.stats.items() if k[2] == name), default=0.0)
+        out.write(f"    {name:<14} {ct:10.4f}s {100 * ct / total if total else 0:6.1f}%\n")
+    out.write("\n")
+
+    stats.stream = out
+    stats.sort_stats('tottime').print_stats(limit)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+def profile_function(func, *args, path, sampling=False, **kwargs):
+    """
+    Profiles the execution of a given function, saving the profile to ``path.prof``
+    and a ranked hot-function report to ``path.txt``.
+
+    If ``sampling`` is True, the function is run a second time under a sampling
+    profiler, and the collapsed stacks are saved to ``path.folded``, one
+    ``frame;frame;... count`` line per stack, ready to be turned into a flamegraph
+    (e.g. with ``flamegraph.pl`` or speedscope).
+    """
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func, *args, **kwargs)
+    profiler.dump_stats(f'{path}.prof')
+
+    with open(f'{path}.txt', 'w') as f:
+        f.write(hot_function_report(pstats.Stats(profiler)))
+
+    # The sampler relies on SIGPROF, which is not available on every platform
+    if sampling and hasattr(signal, 'setitimer'):
+        with _Sampler() as sampler:
+            func(*args, **kwargs)
+
+        with open(f'{path}.folded', 'w') as f:
+            for stack, count in sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    return result
@@ -0,0 +1,192 @@
+"""Registry of the Jacobian implementations available to the benchmarks.
+
+Implementations are declared by the module and attribute holding them, and are
+only imported when selected, so that optional dependencies (``symengine``,
+``protosym``) and slow imports do not affect the rest of the harness.
+"""
+
+import os
+from functools import partial
+from importlib import import_module
+
+
+class Implementation:
+    """
+    A Jacobian implementation with signature ``func(expr, wrt)``, declared with
+    its capabilities.
+
+    Parameters
+    ==========
+
+    name : str
+        The name under which the implementation is selected and its results saved.
+
+    target : str
+        The implementation, as ``'module:attribute'``.
+
+    derivative : bool
+        Whether expressions containing Derivative terms are supported.
+
+    dag_output : bool
+        Whether the output is in DAG form, i.e. a pair of the CSE replacements and
+        of the Jacobian in terms of the replacement symbols.
+
+    rectangular : bool
+        Whether rectangular matrices are accepted as input.
+
+    parallel : bool
+        Whether the ``workers`` keyword argument is accepted.
+
+    kwargs : dict, optional
+        Keyword arguments bound to the implementation.
+
+    """
+
+    def __init__(self, name, target, derivative=False, dag_output=False, rectangular=False,
+                 parallel=False, kwargs=None):
+        self.name = name
+        self.target = target
+        self.derivative = derivative
+        self.dag_output = dag_output
+        self.rectangular = rectangular
+        self.parallel = parallel
+        self.kwargs = kwargs or {}
+
+    def __repr__(self):
+        return f"Implementation({self.name!r}, {self.target!r})"
+
+    def load(self, workers=None):
+        """
+        Imports the implementation and returns it, with its keyword arguments bound.
+        ``workers`` is passed on to the implementations supporting it.
+        """
+
+        module, attr = self.target.split(':')
+        func = getattr(import_module(module), attr)
+
+        kwargs = dict(self.kwargs)
+        if self.parallel and workers is not None:
+            kwargs['workers'] = workers
+
+        return partial(func, **kwargs) if kwargs else func
+
+    def workers(self, workers=None):
+        """
+        The number of worker processes the implementation runs with when loaded with
+        ``workers``, None when it runs in the calling process only.
+        """
+
+        if self.parallel and workers is not None:
+            return workers
+        return self.kwargs.get('workers')
+
+    def available(self):
+        """
+        Whether the implementation and its dependencies can be imported.
+        """
+
+        try:
+            self.load()
+        except ImportError:
+            return False
+        return True
+
+    def capabilities(self):
+        return {
+            'derivative': self.derivative,
+            'dag_output': self.dag_output,
+            'rectangular': self.rectangular,
+            'parallel': self.parallel,
+        }
+
+
+REGISTRY = {}
+
+
+def register(name, target, **capabilities):
+    """
+    Declares an implementation, see ``Implementation``.
+    """
+
+    REGISTRY[name] = Implementation(name, target, **capabilities)
+    return REGISTRY[name]
+
+
+def select(names=None, derivative=None, rectangular=None):
+    """
+    Returns the registered implementations with the given names (all of them by
+    default), in registration order, keeping only the ones with the requested
+    capabilities.
+    """
+
+    if names is None:
+        names = list(REGISTRY)
+
+    unknown = set(names) - set(REGISTRY)
+    if unknown:
+        raise KeyError(f"Unknown implementations: {', '.join(sorted(unknown))}")
+
+    selected = [REGISTRY[name] for name in REGISTRY if name in names]
+    if derivative:
+        selected = [impl for impl in selected if impl.derivative]
+    if rectangular:
+        selected = [impl for impl in selected if impl.rectangular]
+
+    return selected
+
+
+def load(names=None, workers=None, **capabilities):
+    """
+    Returns a dictionary from names to loaded implementations, as used by the
+    benchmarks. Implementations which can't be imported are skipped with a message.
+    """
+
+    implementations = {}
+    for impl in select(names, **capabilities):
+        try:
+            implementations[impl.name] = impl.load(workers=workers)
+        except ImportError as e:
+            print(f"Skipping {impl.name}: {e}")
+
+    return implementations
+
+
+register('jacobian_classic', 'implementations.jacobian_classic:jacobian_classic',
+         derivative=True)
+register('forward_jacobian_sdm', 'implementations.forward_jacobian_sdm:forward_jacobian_sdm')
+register('forward_jacobian_sdm_poly', 'implementations.forward_jacobian_sdm:forward_jacobian_sdm',
+         kwargs={'domain': 'poly'})
+register('forward_jacobian_sdm_frac', 'implementations.forward_jacobian_sdm:forward_jacobian_sdm',
+         kwargs={'domain': 'frac'})
+register('forward_jacobian_sdm_non_exraw',
+         'implementations.forward_jacobian_sdm_non_exraw:forward_jacobian_sdm_non_exraw')
+register('forward_jacobian_ric2', 'implementations.forward_jacobian_ric2:forward_jacobian_ric2')
+register('forward_jacobian_ric3', 'implementations.forward_jacobian_ric3:forward_jacobian_ric3')
+register('forward_jacobian_ric4', 'implementations.forward_jacobian_ric4:forward_jacobian_ric4',
+         derivative=True)
+register('forward_jacobian_final', 'implementations.forward_jacobian_final:forward_jacobian',
+         derivative=True, parallel=True)
+register('forward_jacobian_final_spill', 'implementations.forward_jacobian_final:forward_jacobian',
+         derivative=True, parallel=True, kwargs={'spill_after': 8})
+register('forward_jacobian_final_parallel', 'implementations.forward_jacobian_final:forward_jacobian',
+         derivative=True, parallel=True, kwargs={'workers': os.cpu_count()})
+register('forward_jacobian_final_dag',
+         'implementations.forward_jacobian_final:_forward_jacobian_norm_in_dag_out',
+         derivative=True, dag_output=True)
+register('forward_jacobian_columns', 'implementations.forward_jacobian_columns:forward_jacobian_columns',
+         derivative=True, parallel=True, kwargs={'workers': os.cpu_count()})
+register('forward_jacobian_blocks', 'implementations.forward_jacobian_blocks:forward_jacobian_blocks',
+         derivative=True, rectangular=True, parallel=True)
+register('jacobian_vertex_elimination',
+         'implementations.jacobian_vertex_elimination:jacobian_vertex_elimination',
+         derivative=True, rectangular=True)
+register('forward_jacobian_sam', 'implementations.forward_jacobian_sam:forward_jacobian_sam')
+register('jacobian_protosym', 'implementations.jacobian_protosym:jacobian_protosym')
+register('jacobian_symengine', 'implementations.jacobian_symengine:jacobian_symengine',
+         derivative=True, rectangular=True)
+
+
+# Implementations run by default, the others are selected explicitly
+DEFAULT = ['jacobian_classic', 'forward_jacobian_sdm', 'forward_jacobian_sdm_non_exraw',
+           'forward_jacobian_final', 'forward_jacobian_final_spill',
+           'forward_jacobian_final_parallel', 'forward_jacobian_columns']
@@ -0,0 +1,159 @@
+"""Module for second order differentiation using CSE."""
+
+from sympy import cse, Matrix, MatrixBase, ImmutableDenseMatrix, Basic
+from sympy.utilities.iterables import numbered_symbols
+
+from implementations.forward_jacobian_final import (_forward_jacobian_core,
+                                                    _required_replacements,
+                                                    _expand_replacements)
+
+
+def _forward_hessians_dag(expr, wrt):
+    """
+    Compute the upper triangles of the Hessians of every element of ``expr`` in DAG
+    form. Returns the replacements and a list with, for each output, a dictionary
+    mapping (j, k) with j <= k to the DAG form of the second derivative.
+    """
+
+    if not isinstance(wrt, (MatrixBase, list, tuple)):
+        raise TypeError("``wrt`` must be an iterable of variables")
+
+    wrt = Matrix(wrt)
+    l_wrt = len(wrt)
+
+    # First order, forward accumulation over the CSE DAG
+    replacements, reduced_expr = cse(expr)
+    replacements, J, _ = _forward_jacobian_core(replacements, reduced_expr, wrt)
+
+    # Second order, forward accumulation over the same DAG extended by the first
+    # order results. Only the columns k >= j of the derivative of J[i, j] are needed.
+    entries = [(i, j) for i in range(J.shape[0]) for j in range(l_wrt) if J[i, j] != 0]
+    if not entries:
+        return replacements, [{} for _ in range(J.shape[0])]
+
+    # The DAG is extended with the subexpressions shared by the first order entries,
+    # numbered after the existing replacement symbols
+    rep_syms = numbered_symbols('x', start=len(replacements), exclude=expr.free_symbols)
+    first_order_replacements, first_order = cse([J[i, j] for i, j in entries], symbols=rep_syms)
+    replacements = replacements + first_order_replacements
+
+    columns = [range(j, l_wrt) for _, j in entries]
+    replacements, H, _ = _forward_jacobian_core(replacements, [Matrix(first_order)], wrt,
+                                                columns=columns)
+
+    hessians = [{} for _ in range(J.shape[0])]
+    for (row, k), value in H.todok().items():
+        i, j = entries[row]
+        hessians[i][(j, k)] = value
+
+    return replacements, hessians
+
+
+def _symmetric(upper, l_wrt, cls):
+    """
+    Build a symmetric matrix from the dok form of its upper triangle.
+    """
+
+    dok = dict(upper)
+    dok.update({(k, j): value for (j, k), value in upper.items()})
+    return cls(Matrix(l_wrt, l_wrt, lambda j, k: dok.get((j, k), 0)))
+
+
+def forward_hessians(expr, wrt, dag=False):
+    r"""
+    Returns the Hessian matrix of every element of ``expr`` produced using
+    forward-over-forward accumulation.
+
+    Explanation
+    ===========
+
+    The Jacobian is first computed in DAG form with the forward engine of
+    ``forward_jacobian``. Its entries, which are expressed in terms of the CSE
+    replacement symbols, are then differentiated again with the same engine on
+    the same DAG, extended with the subexpressions the entries share. They are
+    never back-substituted, whereas nesting two ``forward_jacobian`` calls runs
+    ``cse`` again on the expanded first order expressions.
+
+    The symmetry of the Hessians is exploited: the derivative of ``J[i, j]`` is
+    only computed with respect to ``wrt[j:]``, and the lower triangle is filled in
+    by mirroring.
+
+    Parameters
+    ==========
+
+    expr : Matrix
+        The vector whose elements are differentiated twice.
+
+    wrt : Matrix, list, or tuple
+        The vector with respect to which to do the differentiation. Can be a matrix or an iterable of variables.
+
+    dag : bool, optional
+        If True, return the replacements together with the Hessians in DAG form.
+        Default is False.
+
+    Returns
+    =======
+
+    A list with one ``len(wrt)`` by ``len(wrt)`` matrix per element of ``expr``.
+
+    """
+
+    if not isinstance(expr, MatrixBase):
+        raise TypeError("``expr`` must be of matrix type")
+
+    replacements, hessians = _forward_hessians_dag(expr, wrt)
+    l_wrt = len(wrt)
+
+    if not dag and replacements:
+        rep_index = {rep_sym: i for i, (rep_sym, _) in enumerate(replacements)}
+        precomputed_fs = [sub_expr.free_symbols for _, sub_expr in replacements]
+        values = [value for upper in hessians for value in upper.values()]
+        required = _required_replacements(values, rep_index, precomputed_fs)
+        sub_rep = _expand_replacements(required, replacements, precomputed_fs)
+        hessians = [{key: value.xreplace(sub_rep) for key, value in upper.items()}
+                    for upper in hessians]
+
+    hessians = [_symmetric(upper, l_wrt, ImmutableDenseMatrix) for upper in hessians]
+
+    if dag:
+        return replacements, hessians
+
+    return hessians
+
+
+def forward_hessian(expr, wrt, dag=False):
+    r"""
+    Returns the Hessian matrix of a scalar expression produced using
+    forward-over-forward accumulation.
+
+    See ``forward_hessians`` for the details of the algorithm.
+
+    Parameters
+    ==========
+
+    expr : Expr or Matrix
+        The scalar expression to be differentiated twice, or a matrix with a single
+        element.
+
+    wrt : Matrix, list, or tuple
+        The vector with respect to which to do the differentiation. Can be a matrix or an iterable of variables.
+
+    dag : bool, optional
+        If True, return the replacements together with the Hessian in DAG form.
+        Default is False.
+
+    """
+
+    if isinstance(expr, MatrixBase):
+        if len(expr) != 1:
+            raise TypeError("``expr`` must be a scalar or a matrix with a single element")
+    elif isinstance(expr, Basic):
+        expr = ImmutableDenseMatrix([expr])
+    else:
+        raise TypeError("``expr`` must be a scalar expression")
+
+    if dag:
+        replacements, (hessian,) = forward_hessians(expr, wrt, dag=True)
+        return replacements, hessian
+
+    return forward_hessians(expr, wrt)[0]
@@ -0,0 +1,197 @@
+"""Module for differentiation by decomposition into independent blocks using CSE."""
+
+from concurrent.futures import ProcessPoolExecutor
+
+from sympy import cse, Matrix, SparseMatrix, MatrixBase, preorder_traversal
+
+from implementations.forward_jacobian_final import (_forward_jacobian_core, _postprocess,
+                                                    _required_replacements,
+                                                    _expand_replacements)
+
+
+def _find(parent, x):
+    """
+    Find the root of ``x`` in the union-find forest ``parent``, halving paths.
+    """
+
+    while parent[x] != x:
+        parent[x] = parent[parent[x]]
+        x = parent[x]
+    return x
+
+
+def _direct_dependencies(node, wrt_index):
+    """
+    Return the indices of the elements of ``wrt`` appearing directly in ``node``.
+    """
+
+    return {wrt_index[n] for n in preorder_traversal(node) if n in wrt_index}
+
+
+def _dependency_blocks(replacements, reduced_expr, wrt):
+    """
+    Build the bipartite output-variable dependency graph of a CSE result, going
+    through the replacement subexpressions, and split it in connected components.
+
+    Returns a list of (rows, cols) pairs, one per component that has at least one
+    output and one variable. Rows and columns not appearing in any block are zero
+    in the Jacobian.
+    """
+
+    wrt_index = {w: k for k, w in enumerate(wrt)}
+    rep_deps = {}
+    for rep_sym, sub_expr in replacements:
+        deps = _direct_dependencies(sub_expr, wrt_index)
+        for s in sub_expr.free_symbols:
+            deps |= rep_deps.get(s, set())
+        rep_deps[rep_sym] = deps
+
+    out_deps = []
+    for r in reduced_expr:
+        deps = _direct_dependencies(r, wrt_index)
+        for s in r.free_symbols:
+            deps |= rep_deps.get(s, set())
+        out_deps.append(deps)
+
+    # Outputs are nodes 0..m-1 and variables m..m+n-1 of the union-find forest
+    m = len(out_deps)
+    parent = list(range(m + len(wrt)))
+    for i, deps in enumerate(out_deps):
+        for k in deps:
+            ri, rk = _find(parent, i), _find(parent, m + k)
+            if ri != rk:
+                parent[rk] = ri
+
+    components = {}
+    for i, deps in enumerate(out_deps):
+        if deps:
+            components.setdefault(_find(parent, i), (set(), set()))[0].add(i)
+    for rows, cols in components.values():
+        cols.update(k for i in rows for k in out_deps[i])
+
+    blocks = [(sorted(rows), sorted(cols)) for rows, cols in components.values()]
+    blocks.sort()
+
+    return blocks
+
+
+def _block_problem(replacements, reduced_expr, rows, cols, wrt, rep_index, precomputed_fs):
+    """
+    Restrict a CSE result to the outputs in ``rows`` and the variables in ``cols``,
+    keeping only the replacements those outputs depend on.
+    """
+
+    block_expr = [reduced_expr[i] for i in rows]
+    required = _required_replacements(block_expr, rep_index, precomputed_fs)
+    block_replacements = [replacements[j] for j in required]
+
+    return block_replacements, [Matrix(block_expr)], Matrix([wrt[k] for k in cols])
+
+
+def _jacobian_block(task):
+    """
+    Differentiate one independent block and back-substitute its entries. Returns
+    the entries in dok form, with indices local to the block.
+    """
+
+    replacements, reduced_expr, wrt = task
+    replacements, J, precomputed_fs = _forward_jacobian_core(replacements, reduced_expr, wrt)
+    J = J.todok()
+
+    if replacements:
+        rep_index = {rep_sym: i for i, (rep_sym, _) in enumerate(replacements)}
+        required = _required_replacements(J.values(), rep_index, precomputed_fs)
+        sub_rep = _expand_replacements(required, replacements, precomputed_fs)
+        J = {key: value.xreplace(sub_rep) for key, value in J.items()}
+
+    return J
+
+
+def forward_jacobian_blocks(expr, wrt, workers=None, return_stats=False):
+    r"""
+    Returns the Jacobian matrix produced using a forward accumulation
+    algorithm, after decomposing the system into independent blocks.
+
+    Explanation
+    ===========
+
+    Multibody equations often split into groups of outputs which depend on
+    disjoint groups of variables. After running ``cse`` this function builds the
+    bipartite dependency graph between the outputs in ``expr`` and the variables
+    in ``wrt`` (following the dependencies through the replacement
+    subexpressions) and finds its connected components. Each component is then
+    differentiated on its own with the forward engine of ``forward_jacobian``,
+    using only the subexpressions it depends on, and the blocks are assembled in
+    the final matrix. Entries outside every block are known to be zero and are
+    never computed.
+
+    Parameters
+    ==========
+
+    expr : Matrix
+        The vector to be differentiated.
+
+    wrt : Matrix, list, or tuple
+        The vector with respect to which to do the differentiation. Can be a matrix or an iterable of variables.
+
+    workers : int, optional
+        If given, the blocks are differentiated in parallel in a pool of
+        ``workers`` processes.
+
+    return_stats : bool, optional
+        If True, also return a dictionary of statistics about the decomposition.
+        ``dense_work`` and ``block_work`` count the (DAG node, variable) tangent
+        pairs propagated when treating the system as one dense block and after the
+        decomposition, respectively. Default is False.
+
+    """
+
+    if not isinstance(expr, MatrixBase):
+        raise TypeError("``expr`` must be of matrix type")
+
+    if not isinstance(wrt, (MatrixBase, list, tuple)):
+        raise TypeError("``wrt`` must be an iterable of variables")
+
+    replacements, reduced_expr = cse(expr)
+    replacements, reduced_expr = _postprocess(replacements, reduced_expr)
+    reduced_expr = list(reduced_expr[0])
+    wrt = list(wrt)
+
+    blocks = _dependency_blocks(replacements, reduced_expr, wrt)
+
+    rep_index = {rep_sym: i for i, (rep_sym, _) in enumerate(replacements)}
+    precomputed_fs = [sub_expr.free_symbols for _, sub_expr in replacements]
+    tasks = [_block_problem(replacements, reduced_expr, rows, cols, wrt, rep_index, precomputed_fs)
+             for rows, cols in blocks]
+
+    if workers is not None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_jacobian_block, tasks))
+    else:
+        results = [_jacobian_block(task) for task in tasks]
+
+    J = {}
+    for (rows, cols), J_block in zip(blocks, results):
+        J.update({(rows[i], cols[j]): value for (i, j), value in J_block.items()})
+
+    J = SparseMatrix(len(reduced_expr), len(wrt), J)
+    J = expr.__class__(J)
+
+    if not return_stats:
+        return J
+
+    l_sub, l_red, l_wrt = len(replacements), len(reduced_expr), len(wrt)
+    dense_work = (l_sub + l_red) * l_wrt
+    block_work = sum((len(task[0]) + len(rows)) * len(cols)
+                     for task, (rows, cols) in zip(tasks, blocks))
+    stats = {
+        'blocks': len(blocks),
+        'block_shapes': [(len(rows), len(cols)) for rows, cols in blocks],
+        'dense_entries': l_red * l_wrt,
+        'block_entries': sum(len(rows) * len(cols) for rows, cols in blocks),
+        'dense_work': dense_work,
+        'block_work': block_work,
+        'avoided_work': 1 - block_work / dense_work if dense_work else 0.0,
+    }
+
+    return J, stats
@@ -0,0 +1,126 @@
+"""Module for column-partitioned parallel differentiation using CSE."""
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from sympy import cse, Matrix, SparseMatrix, MatrixBase
+
+from implementations.forward_jacobian_final import (_forward_jacobian_core,
+                                                    _required_replacements,
+                                                    _expand_replacements)
+
+
+_worker_cse = None
+
+
+def _init_columns_worker(replacements, reduced_expr):
+    """
+    Process pool initializer, sends the CSE result to each worker a single time.
+    """
+
+    global _worker_cse
+    _worker_cse = (replacements, reduced_expr)
+
+
+def _jacobian_columns(task):
+    """
+    Process pool task, differentiates the shared CSE result with respect to one
+    block of ``wrt`` and returns the back-substituted block in dok form, with
+    column indices offset to their position in the full Jacobian.
+    """
+
+    offset, wrt_block = task
+    replacements, reduced_expr = _worker_cse
+
+    replacements, J, precomputed_fs = _forward_jacobian_core(replacements, reduced_expr, wrt_block)
+    J = J.todok()
+
+    if replacements:
+        rep_index = {rep_sym: i for i, (rep_sym, _) in enumerate(replacements)}
+        required = _required_replacements(J.values(), rep_index, precomputed_fs)
+        sub_rep = _expand_replacements(required, replacements, precomputed_fs)
+        J = {key: value.xreplace(sub_rep) for key, value in J.items()}
+
+    return {(i, j + offset): value for (i, j), value in J.items()}
+
+
+def _split_wrt(wrt, blocks):
+    """
+    Split ``wrt`` into at most ``blocks`` contiguous column blocks of nearly equal
+    length, returned as (offset, block) pairs.
+    """
+
+    wrt = list(wrt)
+    blocks = max(1, min(blocks, len(wrt)))
+    size, extra = divmod(len(wrt), blocks)
+
+    split, start = [], 0
+    for k in range(blocks):
+        stop = start + size + (k < extra)
+        split.append((start, Matrix(wrt[start:stop])))
+        start = stop
+
+    return split
+
+
+def forward_jacobian_columns(expr, wrt, blocks=None, workers=None):
+    r"""
+    Returns the Jacobian matrix produced using a forward accumulation
+    algorithm, parallelised over blocks of columns.
+
+    Explanation
+    ===========
+
+    In forward accumulation the tangent of each variable in ``wrt`` propagates
+    through the DAG independently of the others, so the columns of the Jacobian
+    can be computed separately. This function runs ``cse`` once, sends its result
+    a single time to each process of a pool, and lets every worker run the forward
+    engine of ``forward_jacobian`` and the back-substitution for one block of
+    ``wrt``. The column blocks are then stitched into the final matrix.
+
+    This scales with the number of cores when ``wrt`` is long. Note that the local
+    partial derivatives of each DAG node with respect to the replacement symbols
+    are recomputed in every block.
+
+    Parameters
+    ==========
+
+    expr : Matrix
+        The vector to be differentiated.
+
+    wrt : Matrix, list, or tuple
+        The vector with respect to which to do the differentiation. Can be a matrix or an iterable of variables.
+
+    blocks : int, optional
+        Number of column blocks ``wrt`` is split into. Defaults to ``workers``.
+
+    workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+
+    """
+
+    if not isinstance(wrt, (MatrixBase, list, tuple)):
+        raise TypeError("``wrt`` must be an iterable of variables")
+
+    if len(wrt) == 0:
+        return expr.__class__.zeros(len(expr), 0)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if blocks is None:
+        blocks = workers
+
+    replacements, reduced_expr = cse(expr)
+    tasks = _split_wrt(wrt, blocks)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_columns_worker,
+                             initargs=(replacements, reduced_expr)) as pool:
+        J = {}
+        for J_block in pool.map(_jacobian_columns, tasks):
+            J.update(J_block)
+
+    J = SparseMatrix(len(reduced_expr[0]), len(wrt), J)
+    J = expr.__class__(J)
+
+    return J
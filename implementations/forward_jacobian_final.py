@@ -2,8 +2,14 @@
 
 from sympy import cse, Matrix, SparseMatrix, Derivative, MatrixBase
 from collections import Counter, defaultdict
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+import mmap
+import pickle
 import re
-from sympy import Integer, nan, S
+import tempfile
+from sympy import Integer, nan, S, sympify, EXRAW, ImmutableDenseMatrix
+from sympy.polys.matrices import DomainMatrix
 
 
 
@@ -74,11 +80,12 @@ def _check_nan(A, nan_idx, n):
     return nan_idx
 
 
-def _dok_matmul_with_nan_handling(A, B, nan_idx_A, nan_idx_B, rows_A, cols_B):
+def _dok_matmul_with_nan_handling(A, B, nan_idx_A, nan_idx_B, rows_A, cols_B, columns=None):
     """
     Sparse matrix multiplication which handles possible undefined results (example: 0 * infinite).
     It works by knowing beforehand the indexes of te elements of A and B which produce a Nan values.
     which are stored in the two sets nan_idx_A and nan_idx_B
+    If ``columns`` is given, only the columns in ``columns[i]`` are computed for row i.
     """
     C = Counter()
     C_int = Counter()
@@ -100,7 +107,7 @@ def _dok_matmul_with_nan_handling(A, B, nan_idx_A, nan_idx_B, rows_A, cols_B):
     # Standard matrix multiplication to form C_int
     for (i, k), A_value in A.items():
         for (k2, j), B_value in B.items():
-            if k == k2:
+            if k == k2 and (columns is None or j in columns[i]):
                 C_int[(i, j)] += A_value * B_value
 
     # Combine C and C_int to form the final result C
@@ -110,7 +117,159 @@ def _dok_matmul_with_nan_handling(A, B, nan_idx_A, nan_idx_B, rows_A, cols_B):
     return C
 
 
-def _forward_jacobian_core(replacements, reduced_expr, wrt):
+class _RowSpill:
+    """
+    Memory-mapped store for rows of the forward accumulation matrix that are
+    not needed for a while. Rows are pickled into an anonymous temporary file
+    and read back through a read-only memory map when their next consumer is
+    reached.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._map = None
+        self._size = 0
+        self._index = {}
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self):
+        return list(self._index)
+
+    def store(self, key, row):
+        data = pickle.dumps(row, protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.seek(self._size)
+        self._file.write(data)
+        self._index[key] = (self._size, len(data))
+        self._size += len(data)
+
+    def load(self, key):
+        offset, length = self._index.pop(key)
+        if self._map is None or len(self._map) < offset + length:
+            self._file.flush()
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return pickle.loads(self._map[offset:offset + length])
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+def _row_consumers(operands, reduced_fs, rep_sym, l_sub):
+    """
+    Compute, for every replacement symbol, the sorted list of the subexpression
+    indices which read its row of the accumulation matrix. Replacement symbols
+    appearing in the reduced expression are also consumed by ``f2``, which is
+    represented by the index ``l_sub``.
+    """
+
+    consumers = [[] for _ in range(l_sub)]
+    for i, ops in enumerate(operands):
+        for j in ops:
+            consumers[j].append(i)
+
+    for j, s in enumerate(rep_sym):
+        if s in reduced_fs:
+            consumers[j].append(l_sub)
+
+    return consumers
+
+
+def _pop_row(C, row, columns):
+    """
+    Remove a row from the dok matrix C, returning its entries keyed by column.
+    ``columns`` holds the columns the row can have entries in.
+    """
+
+    return {j: value for j in columns if (value := C.pop((row, j), None)) is not None}
+
+
+def _local_partials(i, expr, wrt, operands, columns=None):
+    """
+    Compute the local partial derivatives of a single node of the CSE DAG, both
+    with respect to the variables in ``wrt`` and with respect to the replacement
+    symbols the node reads. ``operands`` is a list of (index, replacement symbol)
+    pairs. If ``columns`` is given, only the derivatives with respect to the
+    variables with these indices are computed. The two results are returned as
+    dok rows keyed by (i, column).
+    """
+
+    pairs = enumerate(wrt) if columns is None else ((j, wrt[j]) for j in sorted(columns))
+    A = {(i, j): diff_value for j, w in pairs if (diff_value := expr.diff(w)) != 0}
+    B = {(i, j): diff_value for j, s in operands if (diff_value := expr.diff(s)) != 0}
+    return A, B
+
+
+_worker_wrt = None
+
+
+def _init_partials_worker(wrt):
+    """
+    Process pool initializer, sends ``wrt`` to each worker a single time.
+    """
+
+    global _worker_wrt
+    _worker_wrt = wrt
+
+
+def _local_partials_chunk(tasks):
+    """
+    Process pool task, computes the local partials of a batch of DAG nodes.
+    """
+
+    return [_local_partials(i, expr, _worker_wrt, operands, columns)
+            for i, expr, operands, columns in tasks]
+
+
+def _parallel_local_partials(tasks, wrt, workers, chunksize=None):
+    """
+    Compute the local partials of all the given DAG nodes across a process pool.
+    Nodes are sent in batches of ``chunksize`` to amortise the pickling cost, and
+    the results are returned in the order of ``tasks``.
+    """
+
+    if chunksize is None:
+        chunksize = max(1, -(-len(tasks) // (4 * workers)))
+
+    chunks = [tasks[k:k + chunksize] for k in range(0, len(tasks), chunksize)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_partials_worker,
+                             initargs=(wrt,)) as pool:
+        return [partials for chunk in pool.map(_local_partials_chunk, chunks) for partials in chunk]
+
+
+def _fold_parameters(replacements, reduced_expr, wrt, params):
+    """
+    Partially evaluate the output of a CSE operation, substituting the numeric
+    values of ``params`` and folding every subexpression that becomes a number into
+    its consumers. The values keep their Float or Rational form. Elements of ``wrt``
+    that are parameters are dropped.
+    """
+
+    values = {p: sympify(value) for p, value in params.items()}
+
+    folded = []
+    for rep_sym, sub_expr in replacements:
+        sub_expr = sub_expr.xreplace(values)
+        if sub_expr.is_number:
+            values[rep_sym] = sub_expr
+        else:
+            folded.append((rep_sym, sub_expr))
+
+    reduced_expr = [red_expr.xreplace(values) for red_expr in reduced_expr]
+    wrt = Matrix([w for w in wrt if w not in values])
+
+    return folded, reduced_expr, wrt
+
+
+def _forward_jacobian_core(replacements, reduced_expr, wrt, spill_after=None, workers=None,
+                           chunksize=None, columns=None, output=None):
     """
     Core function for Jacobian matrix calculation through forward accumulation.
     Takes directly the output of a CSE operation, and an iterable of variables
@@ -136,6 +295,32 @@ def _forward_jacobian_core(replacements, reduced_expr, wrt):
         The matrix of expressions with respect to which to differentiate the reduced
         expression.
 
+    spill_after : int, optional
+        Rows of the accumulation matrix are released as soon as their last consumer
+        has been processed. If given, live rows whose next consumer is more than
+        ``spill_after`` subexpressions away are also moved to a memory-mapped
+        temporary file until they are needed again.
+
+    workers : int, optional
+        If given, the local partial derivatives of every DAG node (the ``f1``, ``f2``,
+        ``Ai`` and ``Bi`` blocks) are computed up front across a pool of ``workers``
+        processes. Only the sparse chain rule combination runs in this process.
+
+    chunksize : int, optional
+        Number of DAG nodes sent to a worker at a time. Defaults to splitting the
+        nodes in about four batches per worker.
+
+    columns : list, optional
+        For each row of the reduced expression, the container of column indices to
+        compute. Entries in other columns are skipped and left as zero. The rows of
+        the accumulation matrix are restricted in the same way, to the columns
+        needed by the outputs which depend on them.
+
+    output : str, optional
+        If ``'dok'``, the Jacobian is returned as the dictionary of its nonzero
+        entries keyed by ``(row, column)``, without building any matrix. By default
+        it is returned in the class of the reduced expression.
+
     """
 
     if not isinstance(reduced_expr[0], MatrixBase):
@@ -162,46 +347,97 @@ def _forward_jacobian_core(replacements, reduced_expr, wrt):
 
     l_sub, l_wrt, l_red = len(sub_expr), len(wrt), len(reduced_expr[0])
 
-    f1 = {
-        (i, j): diff_value
-        for i, r in enumerate(reduced_expr[0])
-        for j, w in enumerate(wrt)
-        if (diff_value := r.diff(w)) != 0
-    }
-
     if not replacements:
-        return [], SparseMatrix(l_red, l_wrt, f1), []
-
-    f2 = {
-        (i, j): diff_value
-        for i, (r, fs) in enumerate([(r, r.free_symbols) for r in reduced_expr[0]])
-        for j, s in enumerate(rep_sym)
-        if s in fs and (diff_value := r.diff(s)) != 0
-    }
+        f1 = {}
+        for i, r in enumerate(reduced_expr[0]):
+            f1.update(_local_partials(i, r, wrt, (), None if columns is None else columns[i])[0])
+        return [], f1 if output == 'dok' else SparseMatrix(l_red, l_wrt, f1), []
 
     precomputed_fs = [
         {symbol for symbol in s.free_symbols if re.compile(r'x\d+').fullmatch(symbol.name)}
         for s in sub_expr
     ]
 
+    # Liveness of the rows of C: a row is dead once its last consumer is processed
+    rep_index = {s: j for j, s in enumerate(rep_sym)}
+    operands = [sorted(rep_index[s] for s in fs if s in rep_index) for fs in precomputed_fs]
+    reduced_fs = set().union(*(r.free_symbols for r in reduced_expr[0]))
+    consumers = _row_consumers(operands, reduced_fs, rep_sym, l_sub)
+
+    # Columns of each row of C needed by the outputs, propagated backwards through the DAG
+    needed = None
+    if columns is not None:
+        needed = [set() for _ in range(l_sub)]
+        for i, r in enumerate(reduced_expr[0]):
+            for s in r.free_symbols:
+                if s in rep_index:
+                    needed[rep_index[s]].update(columns[i])
+        for i in reversed(range(l_sub)):
+            for j in operands[i]:
+                needed[j] |= needed[i]
+
+    # Local partials of the subexpressions (Ai, Bi) and of the reduced expression (f1, f2)
+    sub_tasks = [(i, sub_expr[i], [(j, rep_sym[j]) for j in operands[i]],
+                  None if needed is None else needed[i]) for i in range(l_sub)]
+    red_tasks = [(i, r, sorted((rep_index[s], s) for s in r.free_symbols if s in rep_index),
+                  None if columns is None else columns[i])
+                 for i, r in enumerate(reduced_expr[0])]
+
+    if workers is not None:
+        partials = _parallel_local_partials(sub_tasks + red_tasks, wrt, workers, chunksize)
+        sub_partials, red_partials = iter(partials[:l_sub]), partials[l_sub:]
+    else:
+        sub_partials = (_local_partials(i, e, wrt, ops, cols) for i, e, ops, cols in sub_tasks)
+        red_partials = None
 
-    C = Counter({(0, j): diff_value for j, w in enumerate(wrt) if (diff_value := sub_expr[0].diff(w)) != 0})
+    dead_at = defaultdict(list)
+    for j, uses in enumerate(consumers):
+        last_use = uses[-1] if uses else j
+        if last_use < l_sub:
+            dead_at[last_use].append(j)
+
+    spill = _RowSpill() if spill_after is not None else None
+
+    def row_columns(j):
+        return range(l_wrt) if needed is None else needed[j]
+
+    def release(i):
+        for j in dead_at.pop(i, ()):
+            _pop_row(C, j, row_columns(j))
+
+        if spill is None:
+            return
+
+        for j in (i, *operands[i]):
+            uses = consumers[j]
+            k = bisect_right(uses, i)
+            if k < len(uses) and uses[k] - i > spill_after:
+                spill.store(j, _pop_row(C, j, row_columns(j)))
+
+    def reload(rows):
+        for j in rows:
+            if j in spill:
+                C.update({(j, col): value for col, value in spill.load(j).items()})
+
+    C = Counter(next(sub_partials)[0])
 
     nan_idx_C = set()
     nan_idx_C = _check_nan(C, nan_idx_C, 1)
+    release(0)
 
     for i in range(1, l_sub):
-        Bi = {(i, j): diff_value for j in range(i + 1)
-              if rep_sym[j] in precomputed_fs[i] and (diff_value := sub_expr[i].diff(rep_sym[j])) != 0}
+        if spill is not None:
+            reload(operands[i])
+
+        Ai, Bi = next(sub_partials)
+        Ai = Counter(Ai)
 
         nan_idx_Bi = set()
         nan_idx_Bi = _check_nan(Bi, nan_idx_Bi, 0)
 
-        Ai = Counter({(i, j): diff_value for j, w in enumerate(wrt)
-                      if (diff_value := sub_expr[i].diff(w)) != 0})
-
         if Bi:
-            Ci = _dok_matmul_with_nan_handling(Bi, C, nan_idx_Bi, nan_idx_C, 1, l_wrt)
+            Ci = _dok_matmul_with_nan_handling(Bi, C, nan_idx_Bi, nan_idx_C, 1, l_wrt,
+                                               None if needed is None else {i: needed[i]})
             nan_idx_C = _check_nan(Ci, nan_idx_C, 1)
 
             Ci.update(Ai)
@@ -209,14 +445,32 @@ def _forward_jacobian_core(replacements, reduced_expr, wrt):
         else:
             C.update(Ai)
 
+        release(i)
+
+    if spill is not None:
+        reload(spill.keys())
+        spill.close()
+
+    if red_partials is None:
+        red_partials = [_local_partials(i, r, wrt, ops, cols) for i, r, ops, cols in red_tasks]
+
+    f1, f2 = {}, {}
+    for A, B in red_partials:
+        f1.update(A)
+        f2.update(B)
+
     nan_idx_f2 = set()
     nan_idx_f2 = _check_nan(f2, nan_idx_f2, 0)
 
-    J = _dok_matmul_with_nan_handling(f2, C, nan_idx_f2, nan_idx_C, l_red, l_wrt)
+    J = _dok_matmul_with_nan_handling(f2, C, nan_idx_f2, nan_idx_C, l_red, l_wrt, columns)
 
 
     for (i, j), value in f1.items():
-        J[(i, j)] += value
+        if columns is None or j in columns[i]:
+            J[(i, j)] += value
+
+    if output == 'dok':
+        return replacements, {key: value for key, value in J.items() if value != 0}, precomputed_fs
 
     J = SparseMatrix(l_red, l_wrt, J)
     J = reduced_expr[0].__class__(J)
@@ -224,6 +478,37 @@ def _forward_jacobian_core(replacements, reduced_expr, wrt):
     return replacements, J, precomputed_fs
 
 
+OUTPUTS = ('dok', 'sparse', 'dense', 'domainmatrix')
+
+
+def _build_output(J, shape, output, cls):
+    """
+    Build the Jacobian of the given shape from the dictionary ``J`` of its nonzero
+    entries, in the container requested by ``output`` (see ``forward_jacobian``),
+    by default in the class ``cls``.
+
+    SymPy matrices store their entries as a sparse ``DomainMatrix`` over ``EXRAW``,
+    so matrices are built around one directly, without any intermediate copy.
+    """
+
+    if output == 'dok':
+        return J
+
+    rows = defaultdict(dict)
+    for (i, j), value in J.items():
+        rows[i][j] = value
+    rep = DomainMatrix(dict(rows), shape, EXRAW)
+
+    if output == 'domainmatrix':
+        return rep
+    if output == 'sparse':
+        cls = SparseMatrix
+    elif output == 'dense':
+        cls = ImmutableDenseMatrix
+
+    return cls._fromrep(rep)
+
+
 def _forward_jacobian_norm_in_dag_out(expr, wrt):
 
     replacements, reduced_expr = cse(expr)
@@ -232,7 +517,8 @@ def _forward_jacobian_norm_in_dag_out(expr, wrt):
     return replacements, J
 
 
-def forward_jacobian(expr, wrt):
+def forward_jacobian(expr, wrt, spill_after=None, workers=None, chunksize=None, params=None,
+                     output=None):
     r"""
     Returns the Jacobian matrix produced using a forward accumulation
     algorithm.
@@ -270,6 +556,33 @@ def forward_jacobian(expr, wrt):
     wrt : Matrix, list, or tuple
         The vector with respect to which to do the differentiation. Can be a matrix or an iterable of variables.
 
+    spill_after : int, optional
+        Forward accumulation rows are always released once dead. If given, rows whose
+        next use is more than ``spill_after`` subexpressions away are spilled to a
+        memory-mapped file in the meantime, further reducing peak memory.
+
+    workers : int, optional
+        Number of worker processes computing the local partial derivatives of the
+        DAG nodes in parallel. By default everything runs in the calling process.
+
+    chunksize : int, optional
+        Number of DAG nodes sent to a worker process at a time.
+
+    params : dict, optional
+        A map from parameters to numeric values, substituted into the DAG before
+        the accumulation. Subexpressions that become numbers are folded into
+        their consumers, so no symbolic work is spent on them. Parameters are
+        dropped from ``wrt``, and the Jacobian only has columns for the remaining
+        variables.
+
+    output : str, optional
+        The container of the Jacobian. The entries are accumulated in a dictionary
+        keyed by ``(row, column)``, which is returned as is with ``'dok'``, or as a
+        ``SparseMatrix`` (``'sparse'``), an ``ImmutableDenseMatrix`` (``'dense'``)
+        or a ``DomainMatrix`` over ``EXRAW`` (``'domainmatrix'``), each built once
+        from the dictionary. By default the Jacobian is built in the class of
+        ``expr``.
+
     See Also
     ========
 
@@ -277,27 +590,303 @@ def forward_jacobian(expr, wrt):
 
     """
 
+    if output is not None and output not in OUTPUTS:
+        raise ValueError(f"``output`` must be one of {', '.join(OUTPUTS)}")
+
     replacements, reduced_expr = cse(expr)
 
-    if replacements:
-        rep_sym, _ = map(Matrix, zip(*replacements))
-    else:
-        rep_sym = Matrix([])
+    if params:
+        replacements, reduced_expr, wrt = _fold_parameters(replacements, reduced_expr,
+                                                           wrt, params)
 
     l_wrt = len(wrt)
     l_red = len(reduced_expr[0])
 
-    replacements, J, precomputed_fs = _forward_jacobian_core(replacements, reduced_expr, wrt)
+    replacements, J, precomputed_fs = _forward_jacobian_core(replacements, reduced_expr, wrt,
+                                                             spill_after=spill_after,
+                                                             workers=workers, chunksize=chunksize,
+                                                             output='dok')
 
-    if not replacements: return J
+    J = _back_substitute(replacements, J, precomputed_fs)
 
-    sub_rep = dict(replacements)
-    for i, ik in enumerate(precomputed_fs):
-        sub_dict = {j: sub_rep[j] for j in ik}
-        sub_rep[rep_sym[i]] = sub_rep[rep_sym[i]].xreplace(sub_dict)
+    return _build_output(J, (l_red, l_wrt), output, expr.__class__)
 
-    J = {key: expr.xreplace(sub_rep) for key, expr in J.todok().items()}
-    J = SparseMatrix(l_red, l_wrt, J)
-    J = expr.__class__(J)
 
-    return J
+def forward_jacobians(exprs, wrt, spill_after=None, workers=None, chunksize=None,
+                      params=None, output=None):
+    r"""
+    Returns the Jacobian matrices of several expressions, produced using a single
+    forward accumulation.
+
+    Explanation
+    ===========
+
+    Matrices built from the same kinematics, such as the mass matrix, the forcing
+    vector and the constraint equations of a multibody system, share most of their
+    subexpressions. Calling ``forward_jacobian`` on each of them runs ``cse`` and
+    propagates the tangents of the shared subexpressions once per matrix.
+
+    This function instead runs one combined ``cse`` over all the inputs and one
+    forward accumulation over the stacked reduced expressions, with a single
+    back-substitution memo, and then splits the result into one Jacobian per input.
+
+    Parameters
+    ==========
+
+    exprs : list
+        The matrices to be differentiated. Rectangular matrices are differentiated
+        as the vector of their elements in row-major order, so the Jacobian of an
+        ``r`` by ``c`` matrix has ``r*c`` rows.
+
+    wrt : Matrix, list, or tuple
+        The vector with respect to which to do the differentiation. Can be a matrix or an iterable of variables.
+
+    spill_after, workers, chunksize, params, output :
+        See ``forward_jacobian``.
+
+    Returns
+    =======
+
+    A list with the Jacobian matrix of each element of ``exprs``.
+
+    """
+
+    exprs = list(exprs)
+    if not all(isinstance(expr, MatrixBase) for expr in exprs):
+        raise TypeError("``exprs`` must be a list of matrices")
+
+    if output is not None and output not in OUTPUTS:
+        raise ValueError(f"``output`` must be one of {', '.join(OUTPUTS)}")
+
+    replacements, reduced_exprs = cse(exprs)
+
+    if params:
+        replacements, reduced_exprs, wrt = _fold_parameters(replacements, reduced_exprs,
+                                                            wrt, params)
+
+    offsets = [0]
+    for reduced in reduced_exprs:
+        offsets.append(offsets[-1] + len(reduced))
+    stacked = [Matrix([e for reduced in reduced_exprs for e in reduced])]
+
+    replacements, J, precomputed_fs = _forward_jacobian_core(replacements, stacked, wrt,
+                                                             spill_after=spill_after,
+                                                             workers=workers, chunksize=chunksize,
+                                                             output='dok')
+
+    J = _back_substitute(replacements, J, precomputed_fs)
+
+    blocks = [{} for _ in exprs]
+    for (i, j), value in J.items():
+        k = bisect_right(offsets, i) - 1
+        blocks[k][(i - offsets[k], j)] = value
+
+    return [_build_output(block, (len(expr), len(wrt)), output, expr.__class__)
+            for expr, block in zip(exprs, blocks)]
+
+
+def forward_jacobian_many(problems, spill_after=None, workers=None, chunksize=None,
+                          output=None):
+    r"""
+    Returns the Jacobian matrices of many small independent problems.
+
+    Explanation
+    ===========
+
+    For small expressions the fixed cost of a ``forward_jacobian`` call (input
+    validation, the setup of ``cse`` and of the accumulation, and the conversions
+    of the output) dominates. Here that cost is paid once per batch: the elements
+    of every problem are stacked into a single vector, which goes through one
+    ``cse`` and one forward accumulation, and the result is split into one
+    Jacobian per problem.
+
+    The accumulation runs with respect to the union of the variables of all the
+    problems, but every output row only computes the columns of the variables of
+    its own problem (see ``columns`` in ``_forward_jacobian_core``), so problems
+    with different variables do not differentiate each other's nodes.
+
+    Parameters
+    ==========
+
+    problems : list
+        A list of ``(expr, wrt)`` pairs, see ``forward_jacobian``. Rectangular
+        matrices are differentiated as the vector of their elements in row-major
+        order, as in ``forward_jacobians``.
+
+    spill_after, workers, chunksize, output :
+        See ``forward_jacobian``.
+
+    Returns
+    =======
+
+    A list with the Jacobian matrix of each problem.
+
+    """
+
+    problems = [(expr, list(wrt)) for expr, wrt in problems]
+    if not all(isinstance(expr, MatrixBase) for expr, _ in problems):
+        raise TypeError("``expr`` must be of matrix type")
+
+    if output is not None and output not in OUTPUTS:
+        raise ValueError(f"``output`` must be one of {', '.join(OUTPUTS)}")
+
+    if not problems:
+        return []
+
+    # Columns of every problem's variables in the union of the variables
+    wrt_index = {}
+    positions = [[wrt_index.setdefault(w, len(wrt_index)) for w in wrt] for _, wrt in problems]
+
+    rows, columns, offsets = [], [], [0]
+    for (expr, _), cols in zip(problems, positions):
+        cols = set(cols)
+        rows.extend(expr)
+        columns.extend(cols for _ in range(len(expr)))
+        offsets.append(len(rows))
+
+    replacements, reduced_expr = cse(Matrix(rows))
+
+    replacements, J, precomputed_fs = _forward_jacobian_core(replacements, reduced_expr,
+                                                             list(wrt_index),
+                                                             spill_after=spill_after,
+                                                             workers=workers, chunksize=chunksize,
+                                                             columns=columns, output='dok')
+
+    J = _back_substitute(replacements, J, precomputed_fs)
+
+    # Back to the row and column indices of each problem
+    local = []
+    for cols in positions:
+        local.append(defaultdict(list))
+        for j, col in enumerate(cols):
+            local[-1][col].append(j)
+
+    blocks = [{} for _ in problems]
+    for (i, col), value in J.items():
+        k = bisect_right(offsets, i) - 1
+        for j in local[k][col]:
+            blocks[k][(i - offsets[k], j)] = value
+
+    return [_build_output(block, (len(expr), len(wrt)), output, expr.__class__)
+            for (expr, wrt), block in zip(problems, blocks)]
+
+
+def _required_replacements(exprs, rep_index, precomputed_fs):
+    """
+    Return the sorted indices of the replacement symbols the expressions depend on,
+    either directly or through other replacement symbols.
+    """
+
+    stack = [rep_index[s] for e in exprs for s in e.free_symbols if s in rep_index]
+    required = set()
+    while stack:
+        j = stack.pop()
+        if j in required:
+            continue
+        required.add(j)
+        stack.extend(rep_index[s] for s in precomputed_fs[j] if s in rep_index)
+
+    return sorted(required)
+
+
+def _expand_replacements(required, replacements, precomputed_fs):
+    """
+    Build the back-substitution dictionary for the replacement symbols with the
+    given indices, which must be closed under dependency and sorted.
+    """
+
+    sub_rep = {}
+    for j in required:
+        rep_sym, sub_expr = replacements[j]
+        sub_dict = {k: sub_rep[k] for k in precomputed_fs[j] if k in sub_rep}
+        sub_rep[rep_sym] = sub_expr.xreplace(sub_dict)
+
+    return sub_rep
+
+
+def _back_substitute(replacements, J, precomputed_fs):
+    """
+    Back-substitute every replacement symbol into the entries of a Jacobian in dok
+    form, as returned by ``_forward_jacobian_core``.
+    """
+
+    if not replacements:
+        return J
+
+    sub_rep = _expand_replacements(range(len(replacements)), replacements, precomputed_fs)
+    return {key: value.xreplace(sub_rep) for key, value in J.items()}
+
+
+def iter_jacobian_rows(expr, wrt, chunk=1, dag=False, spill_after=None):
+    r"""
+    Generator yielding the Jacobian matrix one block of rows at a time.
+
+    Explanation
+    ===========
+
+    The forward accumulation is run a single time, as in ``forward_jacobian``,
+    but the Jacobian is then handed back in blocks of ``chunk`` rows instead of
+    as a single matrix. Each block is back-substituted on its own, using only the
+    replacement symbols it depends on, and the substitution memo is discarded
+    before the next block is produced. Memory use is then bounded by the size of
+    a block rather than by the size of the whole expanded Jacobian, at the cost
+    of re-expanding replacements shared between blocks.
+
+    If ``dag`` is True the blocks are not back-substituted. Along with each block
+    the replacements it needs that were not already yielded with an earlier block
+    are returned, in dependency order, so that a consumer (e.g. a code generator)
+    can emit them incrementally.
+
+    Parameters
+    ==========
+
+    expr : Matrix
+        The vector to be differentiated.
+
+    wrt : Matrix, list, or tuple
+        The vector with respect to which to do the differentiation. Can be a matrix or an iterable of variables.
+
+    chunk : int, optional
+        Number of Jacobian rows in each yielded block. Default is 1.
+
+    dag : bool, optional
+        Whether to yield the blocks in DAG form. Default is False.
+
+    spill_after : int, optional
+        See ``forward_jacobian``.
+
+    Yields
+    ======
+
+    (start, block) : tuple
+        If ``dag`` is False, the index of the first row of the block and the
+        back-substituted block.
+
+    (start, replacements, block) : tuple
+        If ``dag`` is True, the index of the first row of the block, the list of
+        new replacements needed by the block and the block in DAG form.
+
+    """
+
+    if chunk < 1:
+        raise ValueError("``chunk`` must be a positive integer")
+
+    replacements, reduced_expr = cse(expr)
+    replacements, J, precomputed_fs = _forward_jacobian_core(replacements, reduced_expr, wrt,
+                                                             spill_after=spill_after)
+
+    rep_index = {rep_sym: i for i, (rep_sym, _) in enumerate(replacements)}
+    emitted = set()
+
+    for start in range(0, J.shape[0], chunk):
+        block = J[start:start + chunk, :]
+        required = _required_replacements(block, rep_index, precomputed_fs)
+
+        if dag:
+            new = [replacements[j] for j in required if j not in emitted]
+            emitted.update(required)
+            yield start, new, expr.__class__(block)
+            continue
+
+        sub_rep = _expand_replacements(required, replacements, precomputed_fs)
+        yield start, expr.__class__(block.xreplace(sub_rep))
@@ -1,8 +1,28 @@
-from sympy import cse, Matrix, SparseMatrix
-from sympy.polys.matrices.sdm import SDM, sdm_matmul_exraw
-from sympy import EXRAW
+from sympy import cse, Matrix, SparseMatrix, default_sort_key, zoo
+from sympy.polys.matrices.sdm import SDM, sdm_matmul, sdm_matmul_exraw
+from sympy.polys.polyerrors import CoercionFailed
+from sympy import EXRAW, QQ, ZZ
+
+def forward_jacobian_sdm(expr, wrt, domain='EXRAW'):
+    """
+    Forward accumulation of the Jacobian with the sparse products done by ``SDM``.
+
+    By default every block is in the ``EXRAW`` domain. With ``domain='poly'`` the
+    local partials are converted to a polynomial ring over ZZ or QQ, whose
+    generators are the atoms the partials are built from (symbols, replacement
+    symbols and function applications such as ``sin(q)``), so that the products
+    run in polynomial arithmetic. With ``domain='frac'`` the fraction field of the
+    ring is used instead, so that partials with denominators are converted too.
+    Entries which can't be converted (floats, infinities, or denominators in the
+    polynomial ring) are kept in ``EXRAW``, see ``_split``.
+    """
+
+    if domain not in ('EXRAW', 'poly', 'frac'):
+        raise ValueError("``domain`` must be one of EXRAW, poly, frac")
+
+    if domain != 'EXRAW':
+        return _forward_jacobian_sdm_domain(expr, wrt, domain)
 
-def forward_jacobian_sdm(expr, wrt):
     # CSE
     replacements, reduced_expr = cse(expr)
     rep_sym, sub_expr = map(Matrix, zip(*replacements))
@@ -51,3 +71,201 @@ def forward_jacobian_sdm(expr, wrt):
 
     return J
 
+
+def _rational_generators(expr):
+    """
+    Returns the generators of ``expr`` seen as a rational function with rational
+    coefficients, whether it has denominators and whether its coefficients are all
+    integers, or None if it has inexact or infinite numbers. Anything other than a
+    sum, a product, an integer power or a rational number is a generator.
+    """
+
+    gens, fraction, integer = set(), False, True
+    stack = [expr]
+
+    while stack:
+        e = stack.pop()
+        if e.is_Rational:
+            integer = integer and e.is_Integer
+        elif e.is_Number or e is zoo:
+            return None
+        elif e.is_Add or e.is_Mul:
+            stack.extend(e.args)
+        elif e.is_Pow and e.exp.is_Integer:
+            fraction = fraction or e.exp < 0
+            stack.append(e.base)
+        else:
+            gens.add(e)
+
+    return gens, fraction, integer
+
+
+def _polynomial_domain(values, domain):
+    """
+    Returns the polynomial ring (``domain='poly'``) or fraction field
+    (``domain='frac'``) over ZZ or QQ generated by the atoms of ``values``, and the
+    set of the values which can be converted to it.
+    """
+
+    gens, integer, convertible = set(), True, set()
+
+    for value in values:
+        found = _rational_generators(value)
+        if found is None or (found[1] and domain == 'poly'):
+            continue
+
+        gens |= found[0]
+        integer = integer and found[2]
+        convertible.add(value)
+
+    gens = sorted(gens, key=default_sort_key)
+    ground = ZZ if integer else QQ
+    if not gens:
+        return ground, convertible
+
+    return (ground[gens] if domain == 'poly' else ground.frac_field(*gens)), convertible
+
+
+def _split(dok, K, convertible):
+    """
+    Splits a dok matrix of expressions into a dict of dicts over ``K``, for the
+    entries that can be converted, and a dict of dicts over EXRAW for the others.
+    """
+
+    P, E = {}, {}
+    for (i, j), value in dok.items():
+        if value in convertible:
+            try:
+                converted = K.from_sympy(value)
+            except (CoercionFailed, ValueError):
+                pass
+            else:
+                P.setdefault(i, {})[j] = converted
+                continue
+        E.setdefault(i, {})[j] = value
+
+    return P, E
+
+
+def _to_exraw(rows, K):
+    return {i: {j: K.to_sympy(value) for j, value in row.items()} for i, row in rows.items()}
+
+
+def _split_add(A, B, K):
+    """
+    Adds two split matrices. Entries present in the EXRAW part of either operand
+    stay in EXRAW.
+    """
+
+    P = {i: dict(row) for i, row in A[0].items()}
+    E = {i: dict(row) for i, row in A[1].items()}
+
+    for i, row in B[0].items():
+        for j, value in row.items():
+            if j in E.get(i, ()):
+                E[i][j] += K.to_sympy(value)
+            elif j in P.get(i, ()):
+                total = P[i][j] + value
+                if total:
+                    P[i][j] = total
+                else:
+                    del P[i][j]
+            else:
+                P.setdefault(i, {})[j] = value
+
+    for i, row in B[1].items():
+        for j, value in row.items():
+            if j in P.get(i, ()):
+                value += K.to_sympy(P[i].pop(j))
+            elif j in E.get(i, ()):
+                value += E[i][j]
+            E.setdefault(i, {})[j] = value
+
+    P = {i: row for i, row in P.items() if row}
+    return P, E
+
+
+def _split_matmul(A, B, K, m, o):
+    """
+    Multiplies two split matrices. The product of the parts over ``K`` runs in the
+    arithmetic of ``K``, the products involving EXRAW entries run in EXRAW.
+    """
+
+    (Ap, Ae), (Bp, Be) = A, B
+    C = (sdm_matmul(Ap, Bp, K, m, o), {})
+
+    if Ae:
+        needed = {k for row in Ae.values() for k in row}
+        Bp_needed = _to_exraw({k: Bp[k] for k in needed if k in Bp}, K)
+        C = _split_add(C, ({}, sdm_matmul_exraw(Ae, Bp_needed, EXRAW, m, o)), K)
+        C = _split_add(C, ({}, sdm_matmul_exraw(Ae, Be, EXRAW, m, o)), K)
+
+    if Be:
+        needed = set(Be)
+        Ap_needed = {i: {k: v for k, v in row.items() if k in needed} for i, row in Ap.items()}
+        Ap_needed = _to_exraw({i: row for i, row in Ap_needed.items() if row}, K)
+        C = _split_add(C, ({}, sdm_matmul_exraw(Ap_needed, Be, EXRAW, m, o)), K)
+
+    return C
+
+
+def _forward_jacobian_sdm_domain(expr, wrt, domain):
+    """
+    ``forward_jacobian_sdm`` with the blocks converted to a polynomial domain.
+    """
+
+    # CSE
+    replacements, reduced_expr = cse(expr)
+    rep_sym, sub_expr = map(Matrix, zip(*replacements))
+    l_sub, l_wrt, l_red = len(sub_expr), len(wrt), len(reduced_expr[0])
+
+    symbols = expr.free_symbols
+    precomputed_fs = [s.free_symbols - symbols for s in sub_expr]
+
+    # Local partials of every node, as dok matrices of expressions
+    f1 = {(i, j): diff_value for i, r in enumerate(reduced_expr[0])
+          for j, w in enumerate(wrt) if (diff_value := r.diff(w)) != 0}
+
+    f2 = {(i, j): diff_value for i, (r, fs) in enumerate([(r, r.free_symbols) for r in reduced_expr[0]])
+          for j, s in enumerate(rep_sym) if s in fs and (diff_value := r.diff(s)) != 0}
+
+    A = [{(0, j): diff_value for j, w in enumerate(wrt) if (diff_value := sub_expr[i].diff(w)) != 0}
+         for i in range(l_sub)]
+
+    B = [{(0, j): diff_value for j in range(i)
+          if rep_sym[j] in precomputed_fs[i] and (diff_value := sub_expr[i].diff(rep_sym[j])) != 0}
+         for i in range(l_sub)]
+
+    values = [*f1.values(), *f2.values(), *(v for Ai in A for v in Ai.values()),
+              *(v for Bi in B for v in Bi.values())]
+    K, convertible = _polynomial_domain(values, domain)
+
+    C = _split(A[0], K, convertible)
+
+    for i in range(1, l_sub):
+        Ci = _split(A[i], K, convertible)
+
+        if B[i]:
+            Ci = _split_add(_split_matmul(_split(B[i], K, convertible), C, K, 1, l_wrt), Ci, K)
+
+        # Row 0 of Ci is row i of C
+        for part, part_i in zip(C, Ci):
+            if 0 in part_i:
+                part[i] = part_i[0]
+
+    # Differentiate step
+    J = _split_add(_split_matmul(_split(f2, K, convertible), C, K, l_red, l_wrt),
+                   _split(f1, K, convertible), K)
+
+    sub_rep = {rep_sym: sub_expr for rep_sym, sub_expr in replacements}
+    for i, ik in enumerate(precomputed_fs):
+        sub_dict = {j: sub_rep[j] for j in ik}
+        sub_rep[rep_sym[i]] = sub_rep[rep_sym[i]].xreplace(sub_dict)
+
+    Jdok = {(i, j): K.to_sympy(value).xreplace(sub_rep)
+            for i, row in J[0].items() for j, value in row.items()}
+    Jdok.update({(i, j): value.xreplace(sub_rep)
+                 for i, row in J[1].items() for j, value in row.items()})
+    J = SparseMatrix(l_red, l_wrt, Jdok)
+
+    return J
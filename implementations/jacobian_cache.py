@@ -0,0 +1,263 @@
+"""Module for an opt-in persistent cache of Jacobian results."""
+
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+
+import sympy
+from sympy import Basic, MatrixBase, srepr
+
+
+def _canonical(value):
+    """
+    Return ``value`` with its dictionaries turned into lists of items sorted by
+    key, so that its ``srepr`` does not depend on insertion order.
+    """
+
+    if isinstance(value, dict):
+        items = ((k, _canonical(v)) for k, v in value.items())
+        return sorted(items, key=lambda item: srepr(item[0]))
+    if isinstance(value, (list, tuple)):
+        return type(value)(_canonical(v) for v in value)
+    return value
+
+
+def structural_hash(expr, wrt, name, kwargs=None):
+    """
+    Stable hash of a Jacobian computation, built from the structure of ``expr`` and
+    ``wrt``, the implementation name, its keyword arguments and the SymPy version.
+    Unlike ``hash`` it does not depend on the process, so it can be used as a key
+    on disk.
+    """
+
+    options = srepr(_canonical(dict(kwargs or {})))
+
+    h = hashlib.sha256()
+    for part in (name, sympy.__version__, srepr(expr), srepr(wrt), options):
+        h.update(part.encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def _dumps(J):
+    """
+    Serialize a Jacobian, either a matrix or a container of matrices and
+    expressions such as the ``(replacements, J)`` DAG form, in DAG form: every
+    distinct subexpression is stored once, as an atom or as its head and the
+    indices of its arguments, and the resulting table is pickled and compressed.
+    """
+
+    index, nodes = {}, []
+
+    def visit(node):
+        if node in index:
+            return index[node]
+        if node.args:
+            entry = (node.func, tuple(visit(arg) for arg in node.args))
+        else:
+            entry = (None, node)
+        index[node] = len(nodes)
+        nodes.append(entry)
+        return index[node]
+
+    def encode(value):
+        if isinstance(value, MatrixBase):
+            return ('matrix', value.__class__, value.shape, [visit(e) for e in value])
+        if isinstance(value, (list, tuple)):
+            return ('sequence', type(value), [encode(v) for v in value])
+        if isinstance(value, dict):
+            return ('dict', [(encode(k), encode(v)) for k, v in value.items()])
+        if isinstance(value, Basic):
+            return ('expr', visit(value))
+        return ('value', value)
+
+    data = (nodes, encode(J))
+    return zlib.compress(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _loads(data):
+    """
+    Deserialize a Jacobian stored by ``_dumps``, rebuilding each distinct
+    subexpression once from its arguments.
+    """
+
+    nodes, encoded = pickle.loads(zlib.decompress(data))
+
+    built = []
+    for func, args in nodes:
+        built.append(args if func is None else func(*(built[i] for i in args)))
+
+    def decode(value):
+        kind = value[0]
+        if kind == 'matrix':
+            _, cls, shape, entries = value
+            return cls(*shape, [built[i] for i in entries])
+        if kind == 'sequence':
+            return value[1](decode(v) for v in value[2])
+        if kind == 'dict':
+            return {decode(k): decode(v) for k, v in value[1]}
+        if kind == 'expr':
+            return built[value[1]]
+        return value[1]
+
+    return decode(encoded)
+
+
+class JacobianCache:
+    """
+    On-disk cache of Jacobian matrices keyed by ``structural_hash``.
+
+    Entries are stored one per file in DAG form. When the total size of the cache
+    exceeds ``max_bytes`` the least recently used entries are evicted; the
+    modification time of an entry file is refreshed on every hit and used as its
+    last access time.
+
+    Parameters
+    ==========
+
+    directory : str, optional
+        Directory holding the cache. Defaults to the ``JACOBIAN_CACHE_DIR``
+        environment variable, or ``.jacobian_cache`` in the working directory.
+
+    max_bytes : int, optional
+        Maximum total size of the cache files. Default is 1 GB.
+
+    """
+
+    suffix = '.jac'
+
+    def __init__(self, directory=None, max_bytes=2**30):
+        if directory is None:
+            directory = os.environ.get('JACOBIAN_CACHE_DIR', '.jacobian_cache')
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key):
+        """
+        Return the cached matrix for ``key``, or None on a miss.
+        """
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        os.utime(path)
+        self.hits += 1
+        return _loads(data)
+
+    def put(self, key, J):
+        """
+        Store a matrix under ``key``, then evict entries until the cache fits in
+        ``max_bytes``.
+        """
+
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_dumps(J))
+        os.replace(tmp, self._path(key))
+
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Remove every entry of the cache.
+        """
+
+        for _, _, path in self._entries():
+            os.remove(path)
+
+    def stats(self):
+        """
+        Return the hit/miss metrics and the current size of the cache.
+        """
+
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+        }
+
+
+def cached(func, name=None, cache=None):
+    """
+    Wrap a Jacobian implementation ``func(expr, wrt, **kwargs)`` with a persistent
+    cache. Keyword arguments are passed through to ``func`` and are part of the
+    cache key, together with those bound by a ``functools.partial``.
+
+    Parameters
+    ==========
+
+    func : callable
+        Any of the implementations in ``implementations``, possibly wrapped in a
+        ``functools.partial``.
+
+    name : str, optional
+        Name of the implementation used in the cache key. Defaults to the name of
+        ``func``, or of the function wrapped by a ``functools.partial``.
+
+    cache : JacobianCache, optional
+        The cache to use. Defaults to a ``JacobianCache`` with default settings.
+
+    """
+
+    # Keyword arguments bound by (possibly nested) partials
+    bound, base = {}, func
+    while isinstance(base, functools.partial):
+        bound = {**base.keywords, **bound}
+        base = base.func
+
+    if name is None:
+        name = base.__name__
+
+    if cache is None:
+        cache = JacobianCache()
+
+    @functools.wraps(base)
+    def wrapper(expr, wrt, **kwargs):
+        key = structural_hash(expr, wrt, name, {**bound, **kwargs})
+        J = cache.get(key)
+        if J is None:
+            J = func(expr, wrt, **kwargs)
+            cache.put(key, J)
+        return J
+
+    wrapper.cache = cache
+    return wrapper
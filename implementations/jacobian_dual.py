@@ -0,0 +1,175 @@
+"""Module for numeric forward mode (dual number) Jacobians over the CSE DAG."""
+
+import numpy as np
+from sympy import cse, Add, Mul, Pow, MatrixBase
+from sympy import sin, cos, tan, acos, asin, atan, exp, log
+from sympy.core.function import AppliedUndef
+
+from implementations.forward_jacobian_final import _postprocess
+
+
+def _add(*terms):
+    """
+    Sum of optional tangent arrays, None standing for zero.
+    """
+    terms = [t for t in terms if t is not None]
+    if not terms:
+        return None
+    result = terms[0]
+    for t in terms[1:]:
+        result = result + t
+    return result
+
+
+def _scale(factor, t):
+    """
+    Scale a tangent array by a value per point, None standing for zero.
+    """
+    if t is None:
+        return None
+    return np.asarray(factor)[..., None] * t
+
+
+def _eval_mul(args):
+    values = [v for v, _ in args]
+    n = len(values)
+
+    # Prefix and suffix products give the product of all the other factors
+    prefix, suffix = [1.0] * (n + 1), [1.0] * (n + 1)
+    for i in range(n):
+        prefix[i + 1] = prefix[i] * values[i]
+        suffix[n - i - 1] = suffix[n - i] * values[n - i - 1]
+
+    tangent = _add(*(_scale(prefix[i] * suffix[i + 1], t) for i, (_, t) in enumerate(args)))
+    return prefix[n], tangent
+
+
+def _eval_pow(base, exponent):
+    (b, tb), (e, te) = base, exponent
+    value = b ** e
+    if te is None:
+        return value, _scale(e * b ** (e - 1), tb)
+    return value, _add(_scale(value * np.log(b), te), _scale(value * e / b, tb))
+
+
+# Value and derivative of the supported functions of one argument
+_FUNCTIONS = {
+    sin: (np.sin, np.cos),
+    cos: (np.cos, lambda x: -np.sin(x)),
+    tan: (np.tan, lambda x: 1 + np.tan(x) ** 2),
+    asin: (np.arcsin, lambda x: 1 / np.sqrt(1 - x ** 2)),
+    acos: (np.arccos, lambda x: -1 / np.sqrt(1 - x ** 2)),
+    atan: (np.arctan, lambda x: 1 / (1 + x ** 2)),
+    exp: (np.exp, np.exp),
+    log: (np.log, lambda x: 1 / x),
+}
+
+
+def _evaluate(node, memo):
+    """
+    Evaluate a node to a (value, tangent) pair of arrays, propagating the tangents
+    with the chain rule. ``memo`` holds the pairs of the inputs, of the replacement
+    symbols and of every subexpression already evaluated.
+    """
+
+    if node in memo:
+        return memo[node]
+
+    if node.is_number:
+        result = float(node), None
+    elif isinstance(node, Add):
+        args = [_evaluate(arg, memo) for arg in node.args]
+        result = sum(v for v, _ in args), _add(*(t for _, t in args))
+    elif isinstance(node, Mul):
+        result = _eval_mul([_evaluate(arg, memo) for arg in node.args])
+    elif isinstance(node, Pow):
+        result = _eval_pow(_evaluate(node.base, memo), _evaluate(node.exp, memo))
+    elif node.is_Symbol or node.is_Derivative or isinstance(node, AppliedUndef):
+        raise ValueError(f"``args`` does not include {node}")
+    elif node.func in _FUNCTIONS:
+        f, df = _FUNCTIONS[node.func]
+        v, t = _evaluate(node.args[0], memo)
+        result = f(v), _scale(df(v), t)
+    else:
+        raise NotImplementedError(f"Cannot evaluate {node.func} numerically")
+
+    memo[node] = result
+    return result
+
+
+def dual_jacobian(expr, wrt, args=None):
+    r"""
+    Returns a function computing the numeric Jacobian of ``expr`` at many points
+    at once with forward mode automatic differentiation.
+
+    Explanation
+    ===========
+
+    No symbolic differentiation or expansion takes place. The expression is run
+    through ``cse`` once, and for each batch of points its DAG is walked a single
+    time, propagating with NumPy the value of every node together with its
+    tangent array, of shape ``(N, len(wrt))`` (a vector of dual numbers per node).
+    The supported functions are those appearing in the multibody models, namely
+    ``sin``, ``cos``, ``tan``, their inverses, ``exp``, ``log`` and powers
+    (including ``sqrt``).
+
+    The returned function takes an array of points of shape ``(N, len(args))``
+    and returns the values of ``expr``, of shape ``(N, m)``, and of the Jacobian,
+    of shape ``(N, m, n)``.
+
+    Parameters
+    ==========
+
+    expr : Matrix
+        The vector to be differentiated. A rectangular matrix is evaluated as the
+        vector of its elements in row-major order.
+
+    wrt : Matrix, list, or tuple
+        The vector with respect to which to do the differentiation. Can be a matrix or an iterable of variables.
+        Every element must be in ``args``.
+
+    args : list, optional
+        The symbols whose values make up each point, in order. Defaults to ``wrt``.
+        Every free symbol and Derivative in ``expr`` must be included.
+
+    """
+
+    if not isinstance(expr, MatrixBase):
+        raise TypeError("``expr`` must be of matrix type")
+
+    args = list(wrt if args is None else args)
+    wrt = list(wrt)
+    if not set(wrt) <= set(args):
+        raise ValueError("every element of ``wrt`` must be in ``args``")
+
+    replacements, reduced_expr = _postprocess(*cse(expr))
+    reduced_expr = list(reduced_expr[0])
+    wrt_index = {w: k for k, w in enumerate(wrt)}
+    m, n = len(reduced_expr), len(wrt)
+
+    def evaluate(points):
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        N = points.shape[0]
+
+        memo = {}
+        for c, a in enumerate(args):
+            seed = None
+            if a in wrt_index:
+                seed = np.zeros((N, n))
+                seed[:, wrt_index[a]] = 1.0
+            memo[a] = points[:, c], seed
+
+        for rep_sym, sub_expr in replacements:
+            memo[rep_sym] = _evaluate(sub_expr, memo)
+
+        f = np.empty((N, m))
+        J = np.zeros((N, m, n))
+        for i, r in enumerate(reduced_expr):
+            v, t = _evaluate(r, memo)
+            f[:, i] = v
+            if t is not None:
+                J[:, i, :] = t
+
+        return f, J
+
+    return evaluate
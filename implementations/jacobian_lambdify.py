@@ -0,0 +1,92 @@
+"""Module for vectorised numeric evaluation of Jacobians in DAG form."""
+
+import numpy as np
+from sympy import cse, lambdify, Derivative, Dummy, MatrixBase
+
+from implementations.forward_jacobian_final import _forward_jacobian_core, _postprocess
+
+
+def lambdify_jacobian(expr, wrt, args=None, modules='numpy'):
+    r"""
+    Returns a NumPy-vectorised function evaluating ``expr`` and its Jacobian
+    together, compiled from the DAG form of the forward engine.
+
+    Explanation
+    ===========
+
+    Calling ``lambdify`` on the expanded output of ``forward_jacobian`` throws
+    away the subexpression sharing found by ``cse`` and produces very large
+    generated functions. Here the CSE replacements used by the forward engine and
+    the Jacobian in DAG form (together with the reduced expression itself) are
+    compiled into a single function, in which every shared subexpression is
+    evaluated once per batch of states.
+
+    The returned function takes an array of states of shape ``(N, len(args))``
+    and returns the values of ``expr``, of shape ``(N, m)``, and of the Jacobian,
+    of shape ``(N, m, n)``, where ``m`` is the number of elements of ``expr`` and
+    ``n`` the length of ``wrt``.
+
+    Parameters
+    ==========
+
+    expr : Matrix
+        The vector to be differentiated. A rectangular matrix is evaluated as the
+        vector of its elements in row-major order.
+
+    wrt : Matrix, list, or tuple
+        The vector with respect to which to do the differentiation. Can be a matrix or an iterable of variables.
+
+    args : list, optional
+        The symbols whose values make up each state, in order. Defaults to ``wrt``.
+        Every free symbol and Derivative in ``expr`` must be included.
+
+    modules : str, optional
+        The ``lambdify`` module to use. Default is ``'numpy'``.
+
+    """
+
+    if not isinstance(expr, MatrixBase):
+        raise TypeError("``expr`` must be of matrix type")
+
+    args = list(wrt if args is None else args)
+
+    # Arguments which are not symbols (e.g. Derivatives) are replaced by dummies,
+    # as lambdify does not process the subexpressions it is given
+    dummies = {a: Dummy() for a in args if not a.is_Symbol}
+    missing = expr.atoms(Derivative) - set(args)
+    missing |= expr.xreplace(dummies).free_symbols - set(args) - set(dummies.values())
+    if missing:
+        raise ValueError(f"``args`` does not include {missing}")
+
+    replacements, reduced_expr = _postprocess(*cse(expr.reshape(len(expr), 1)))
+    replacements, J, _ = _forward_jacobian_core(replacements, reduced_expr, wrt)
+
+    f_entries = list(reduced_expr[0])
+    J_dok = J.todok()
+    outputs = f_entries + list(J_dok.values())
+
+    args = [dummies.get(a, a) for a in args]
+    replacements = [(s, e.xreplace(dummies)) for s, e in replacements]
+    outputs = [e.xreplace(dummies) for e in outputs]
+
+    func = lambdify(args, outputs, modules=modules, cse=lambda exprs: (replacements, exprs))
+
+    m, n = len(f_entries), len(wrt)
+    J_keys = list(J_dok)
+
+    def evaluate(states):
+        states = np.atleast_2d(np.asarray(states, dtype=float))
+        N = states.shape[0]
+        values = func(*states.T)
+
+        f = np.empty((N, m))
+        for i, value in enumerate(values[:m]):
+            f[:, i] = value
+
+        J = np.zeros((N, m, n))
+        for (i, j), value in zip(J_keys, values[m:]):
+            J[:, i, j] = value
+
+        return f, J
+
+    return evaluate
@@ -0,0 +1,175 @@
+"""Module for Jacobian-vector and vector-Jacobian products using CSE."""
+
+from sympy import cse, sympify, Add, MatrixBase, Symbol
+from sympy.utilities.iterables import numbered_symbols
+
+from implementations.forward_jacobian_final import _postprocess, _local_partials
+
+
+def _cse_graph(expr, wrt, vector):
+    """
+    Run CSE on ``expr`` and return the replacements, the list of reduced outputs,
+    a function giving the (index, replacement symbol) operands of a node, and the
+    set of symbols new replacement symbols must avoid (those of ``expr``, ``wrt``
+    and ``vector``).
+    """
+
+    if not isinstance(expr, MatrixBase):
+        raise TypeError("``expr`` must be of matrix type")
+
+    if not isinstance(wrt, (MatrixBase, list, tuple)):
+        raise TypeError("``wrt`` must be an iterable of variables")
+
+    taken = set(expr.free_symbols).union(*(sympify(e).free_symbols for e in (*wrt, *vector)))
+    replacements, reduced_expr = cse(expr, symbols=numbered_symbols('x', cls=Symbol, exclude=taken))
+    replacements, reduced_expr = _postprocess(replacements, reduced_expr)
+    rep_index = {rep_sym: j for j, (rep_sym, _) in enumerate(replacements)}
+
+    def operands(node):
+        return [(rep_index[s], s) for s in node.free_symbols if s in rep_index]
+
+    return replacements, list(reduced_expr[0]), operands, taken
+
+
+def _expand(replacements, exprs):
+    """
+    Back-substitute a list of replacements, given in dependency order, into exprs.
+    """
+
+    sub_rep = {}
+    for rep_sym, sub_expr in replacements:
+        sub_rep[rep_sym] = sub_expr.xreplace(sub_rep)
+
+    return [e.xreplace(sub_rep) for e in exprs]
+
+
+def jvp(expr, wrt, v, dag=False):
+    r"""
+    Returns the Jacobian-vector product ``J*v`` without forming the Jacobian.
+
+    Explanation
+    ===========
+
+    A single tangent, the directional derivative along ``v``, is pushed forward
+    through the DAG obtained from ``cse``. Each subexpression gets one scalar
+    tangent, represented by a new replacement symbol, so the cost is about one
+    pass over the graph instead of one pass per element of ``wrt``.
+
+    Parameters
+    ==========
+
+    expr : Matrix
+        The vector to be differentiated.
+
+    wrt : Matrix, list, or tuple
+        The vector with respect to which to do the differentiation. Can be a matrix or an iterable of variables.
+
+    v : Matrix, list, or tuple
+        The tangent vector, with the same length as ``wrt``.
+
+    dag : bool, optional
+        If True, return the list of replacements (the CSE ones interleaved with the
+        tangent ones) together with the product in DAG form. Default is False.
+
+    """
+
+    replacements, reduced_expr, operands, taken = _cse_graph(expr, wrt, v)
+
+    if len(v) != len(wrt):
+        raise ValueError("``v`` must have the same length as ``wrt``")
+
+    tangent_syms = numbered_symbols('dx', cls=Symbol, exclude=taken)
+    tangent = {}
+    new_replacements = []
+
+    def directional(i, node):
+        A, B = _local_partials(i, node, wrt, operands(node))
+        return Add(*[value * v[j] for (_, j), value in A.items()],
+                   *[value * tangent[replacements[j][0]] for (_, j), value in B.items()
+                     if replacements[j][0] in tangent])
+
+    for i, (rep_sym, sub_expr) in enumerate(replacements):
+        new_replacements.append((rep_sym, sub_expr))
+        if (t := directional(i, sub_expr)) != 0:
+            tangent[rep_sym] = next(tangent_syms)
+            new_replacements.append((tangent[rep_sym], t))
+
+    result = [directional(i, r) for i, r in enumerate(reduced_expr)]
+
+    if dag:
+        return new_replacements, expr.__class__(result)
+
+    return expr.__class__(_expand(new_replacements, result))
+
+
+def vjp(expr, wrt, w, dag=False):
+    r"""
+    Returns the vector-Jacobian product ``w.T*J`` without forming the Jacobian.
+
+    Explanation
+    ===========
+
+    A single adjoint, seeded with ``w`` at the outputs, is pulled back through
+    the DAG obtained from ``cse`` in reverse order. Each subexpression gets one
+    scalar adjoint, represented by a new replacement symbol, so the cost is about
+    one pass over the graph instead of one pass per output.
+
+    Parameters
+    ==========
+
+    expr : Matrix
+        The vector to be differentiated.
+
+    wrt : Matrix, list, or tuple
+        The vector with respect to which to do the differentiation. Can be a matrix or an iterable of variables.
+
+    w : Matrix, list, or tuple
+        The adjoint vector, with the same length as ``expr``.
+
+    dag : bool, optional
+        If True, return the list of replacements (the CSE ones followed by the
+        adjoint ones) together with the product in DAG form. Default is False.
+
+    Returns
+    =======
+
+    A column matrix with one entry per element of ``wrt``.
+
+    """
+
+    replacements, reduced_expr, operands, taken = _cse_graph(expr, wrt, w)
+
+    if len(w) != len(reduced_expr):
+        raise ValueError("``w`` must have the same length as ``expr``")
+
+    adjoint_syms = numbered_symbols('ax', cls=Symbol, exclude=taken)
+    adjoint_terms = [[] for _ in replacements]
+    gradient_terms = [[] for _ in wrt]
+    new_replacements = []
+
+    def pull_back(i, node, weight):
+        A, B = _local_partials(i, node, wrt, operands(node))
+        for (_, k), value in A.items():
+            gradient_terms[k].append(weight * value)
+        for (_, j), value in B.items():
+            adjoint_terms[j].append(weight * value)
+
+    for i, r in enumerate(reduced_expr):
+        if w[i] != 0:
+            pull_back(i, r, w[i])
+
+    for j in reversed(range(len(replacements))):
+        if (a := Add(*adjoint_terms[j])) == 0:
+            continue
+        adjoint_terms[j] = None
+        adjoint = next(adjoint_syms)
+        new_replacements.append((adjoint, a))
+        pull_back(j, replacements[j][1], adjoint)
+
+    result = [Add(*terms) for terms in gradient_terms]
+    new_replacements = replacements + new_replacements
+
+    if dag:
+        return new_replacements, expr.__class__(result)
+
+    return expr.__class__(_expand(new_replacements, result))
@@ -0,0 +1,229 @@
+"""Module for incremental Jacobian updates using CSE."""
+
+import time
+
+from sympy import cse, Add, Dummy, Matrix, MatrixBase
+from sympy.utilities.iterables import numbered_symbols
+
+from implementations.forward_jacobian_final import _postprocess
+
+
+class JacobianSession:
+    r"""
+    Stateful forward accumulation Jacobian supporting incremental updates.
+
+    Explanation
+    ===========
+
+    The session keeps the CSE DAG of the expression, the local partial
+    derivatives and the tangent row of every node, the Jacobian rows in DAG form
+    and the back-substitution memo. When an output is replaced, the new
+    expression is run through ``cse`` on its own and its subexpressions are
+    matched against the existing nodes, so only new nodes are differentiated.
+    When variables are appended to ``wrt``, only the new columns of the tangent
+    rows are computed, reusing the stored local partials.
+
+    The time taken by each update is returned and recorded in ``timings``.
+
+    Parameters
+    ==========
+
+    expr : Matrix
+        The vector to be differentiated. A rectangular matrix is differentiated as
+        the vector of its elements in row-major order.
+
+    wrt : Matrix, list, or tuple
+        The vector with respect to which to do the differentiation. Can be a matrix or an iterable of variables.
+
+    """
+
+    def __init__(self, expr, wrt):
+        if not isinstance(expr, MatrixBase):
+            raise TypeError("``expr`` must be of matrix type")
+
+        if not isinstance(wrt, (MatrixBase, list, tuple)):
+            raise TypeError("``wrt`` must be an iterable of variables")
+
+        start = time.perf_counter()
+
+        self.wrt = list(wrt)
+        self.timings = []
+        self._cls = expr.__class__
+        # Dummy symbols can't collide with those of later outputs or variables
+        self._symbols = numbered_symbols('x', cls=Dummy)
+
+        # DAG nodes in topological order, with their local partials and tangent rows
+        self._nodes = {}
+        self._node_of = {}
+        self._wrt_partials = {}
+        self._rep_partials = {}
+        self._tangents = {}
+        self._expanded = {}
+
+        # Reduced outputs, their local partials and their Jacobian rows in DAG form
+        n_outputs = len(expr)
+        self._outputs = [None] * n_outputs
+        self._output_wrt_partials = [None] * n_outputs
+        self._output_rep_partials = [None] * n_outputs
+        self._rows = [None] * n_outputs
+        self._expanded_rows = [None] * n_outputs
+
+
+        replacements, reduced = cse(expr, symbols=self._symbols)
+        replacements, reduced = _postprocess(replacements, reduced)
+        alias = self._add_nodes(replacements)
+        for i, r in enumerate(reduced[0]):
+            self._set_output(i, r.xreplace(alias))
+
+        self.timings.append(('init', time.perf_counter() - start))
+
+    def _add_nodes(self, replacements):
+        """
+        Add the replacements of a CSE result to the DAG, reusing any existing node
+        with the same subexpression. Returns the mapping of the replacement symbols
+        which were found to duplicate an existing node.
+        """
+
+        alias = {}
+        for rep_sym, sub_expr in replacements:
+            sub_expr = sub_expr.xreplace(alias)
+            if sub_expr in self._node_of:
+                alias[rep_sym] = self._node_of[sub_expr]
+                continue
+
+            self._nodes[rep_sym] = sub_expr
+            self._node_of[sub_expr] = rep_sym
+            self._wrt_partials[rep_sym] = self._diff_wrt(sub_expr, range(len(self.wrt)))
+            self._rep_partials[rep_sym] = self._diff_rep(sub_expr)
+            self._tangents[rep_sym] = self._combine(self._wrt_partials[rep_sym],
+                                                    self._rep_partials[rep_sym],
+                                                    range(len(self.wrt)))
+
+        return alias
+
+    def _diff_wrt(self, node, columns):
+        """
+        Local partials of a node with respect to the given columns of ``wrt``.
+        """
+        return {j: diff_value for j in columns if (diff_value := node.diff(self.wrt[j])) != 0}
+
+    def _diff_rep(self, node):
+        """
+        Local partials of a node with respect to the DAG nodes it reads.
+        """
+        return {s: diff_value for s in node.free_symbols
+                if s in self._nodes and (diff_value := node.diff(s)) != 0}
+
+    def _combine(self, wrt_partials, rep_partials, columns):
+        """
+        Chain rule: combine the local partials of a node with the tangent rows of the
+        nodes it reads, for the given columns.
+        """
+
+        row = {}
+        for j in columns:
+            terms = [rep_value * self._tangents[s][j] for s, rep_value in rep_partials.items()
+                     if j in self._tangents[s]]
+            if j in wrt_partials:
+                terms.append(wrt_partials[j])
+            if terms and (value := Add(*terms)) != 0:
+                row[j] = value
+        return row
+
+    def _set_output(self, i, reduced):
+        """
+        Store the reduced form of the i-th output and compute its Jacobian row.
+        """
+        self._outputs[i] = reduced
+        self._output_wrt_partials[i] = self._diff_wrt(reduced, range(len(self.wrt)))
+        self._output_rep_partials[i] = self._diff_rep(reduced)
+        self._rows[i] = self._combine(self._output_wrt_partials[i], self._output_rep_partials[i],
+                                      range(len(self.wrt)))
+        self._expanded_rows[i] = None
+
+    def _expand(self, values):
+        """
+        Back-substitute the replacement symbols in values, extending the memo with
+        the expanded form of every node they depend on.
+        """
+
+        stack = [s for v in values for s in v.free_symbols if s in self._nodes]
+        required = set()
+        while stack:
+            s = stack.pop()
+            if s in required or s in self._expanded:
+                continue
+            required.add(s)
+            stack.extend(o for o in self._nodes[s].free_symbols if o in self._nodes)
+
+        # Nodes are stored in topological order
+        for s in self._nodes:
+            if s in required:
+                sub_dict = {o: self._expanded[o] for o in self._nodes[s].free_symbols
+                            if o in self._expanded}
+                self._expanded[s] = self._nodes[s].xreplace(sub_dict)
+
+        return [v.xreplace(self._expanded) for v in values]
+
+    def replace_output(self, i, expr):
+        """
+        Replace the i-th output with a new expression, differentiating only the DAG
+        nodes which are not already present. Returns the time taken.
+        """
+
+        start = time.perf_counter()
+
+        replacements, reduced = cse(Matrix([expr]), symbols=self._symbols)
+        replacements, reduced = _postprocess(replacements, reduced)
+        alias = self._add_nodes(replacements)
+        self._set_output(i, reduced[0][0].xreplace(alias))
+
+        elapsed = time.perf_counter() - start
+        self.timings.append(('replace_output', elapsed))
+        return elapsed
+
+    def add_wrt(self, wrt):
+        """
+        Append variables to ``wrt``, computing only the new columns of the tangent
+        rows and of the Jacobian. Returns the time taken.
+        """
+
+        start = time.perf_counter()
+
+        wrt = [w for w in wrt if w not in self.wrt]
+        columns = range(len(self.wrt), len(self.wrt) + len(wrt))
+        self.wrt.extend(wrt)
+
+        for s, node in self._nodes.items():
+            self._wrt_partials[s].update(self._diff_wrt(node, columns))
+            self._tangents[s].update(self._combine(self._wrt_partials[s], self._rep_partials[s],
+                                                   columns))
+
+        for i, reduced in enumerate(self._outputs):
+            self._output_wrt_partials[i].update(self._diff_wrt(reduced, columns))
+            new = self._combine(self._output_wrt_partials[i], self._output_rep_partials[i], columns)
+            self._rows[i].update(new)
+            if self._expanded_rows[i] is not None:
+                self._expanded_rows[i].update(zip(new, self._expand(new.values())))
+
+        elapsed = time.perf_counter() - start
+        self.timings.append(('add_wrt', elapsed))
+        return elapsed
+
+    def jacobian(self, dag=False):
+        """
+        Return the current Jacobian matrix. If ``dag`` is True, the entries are left
+        in terms of the replacement symbols and the replacements are returned too.
+        """
+
+        shape = (len(self._rows), len(self.wrt))
+
+        if dag:
+            replacements = list(self._nodes.items())
+            return replacements, self._cls(Matrix(*shape, lambda i, j: self._rows[i].get(j, 0)))
+
+        for i, row in enumerate(self._rows):
+            if self._expanded_rows[i] is None:
+                self._expanded_rows[i] = dict(zip(row, self._expand(row.values())))
+
+        return self._cls(Matrix(*shape, lambda i, j: self._expanded_rows[i].get(j, 0)))
@@ -0,0 +1,218 @@
+"""Module for differentiation by vertex elimination on the CSE computational graph."""
+
+import heapq
+
+from sympy import cse, SparseMatrix, MatrixBase
+
+from implementations.forward_jacobian_final import (_postprocess, _required_replacements,
+                                                    _expand_replacements)
+
+
+def markowitz_order(v, preds, succs):
+    """
+    Markowitz heuristic: eliminate first the vertex whose elimination costs the
+    fewest multiplications, i.e. with the smallest product of in- and out-degree.
+    """
+    return len(preds[v]) * len(succs[v])
+
+
+def forward_order(v, preds, succs):
+    """
+    Eliminate the intermediate vertices in topological order (forward mode).
+    """
+    return v
+
+
+def reverse_order(v, preds, succs):
+    """
+    Eliminate the intermediate vertices in reverse topological order (reverse mode).
+    """
+    return -v
+
+
+ORDERINGS = {
+    'forward': forward_order,
+    'reverse': reverse_order,
+    'markowitz': markowitz_order,
+}
+
+
+def _linearized_graph(replacements, reduced_expr, wrt):
+    """
+    Build the linearized computational graph of a CSE result. Vertices are numbered
+    as the variables in ``wrt`` first, then the replacement symbols and finally the
+    outputs; every edge is labelled with the local partial derivative of its head
+    with respect to its tail.
+
+    Returns the predecessor and successor dictionaries, mapping each vertex to a
+    dictionary of adjacent vertices and edge labels.
+    """
+
+    l_wrt, l_sub = len(wrt), len(replacements)
+    rep_index = {rep_sym: l_wrt + j for j, (rep_sym, _) in enumerate(replacements)}
+    n_vertices = l_wrt + l_sub + len(reduced_expr)
+
+    preds = {v: {} for v in range(n_vertices)}
+    succs = {v: {} for v in range(n_vertices)}
+
+    nodes = [sub_expr for _, sub_expr in replacements] + list(reduced_expr)
+    for v, node in enumerate(nodes, start=l_wrt):
+        fs = node.free_symbols
+        operands = list(enumerate(wrt)) + [(rep_index[s], s) for s in fs if s in rep_index]
+        for u, s in operands:
+            if (diff_value := node.diff(s)) != 0:
+                preds[v][u] = diff_value
+                succs[u][v] = diff_value
+
+    return preds, succs
+
+
+def _eliminate(preds, succs, intermediates, key, symbolic=True):
+    """
+    Eliminate the intermediate vertices of the graph, in the order given by the
+    heuristic ``key`` (lower first, re-evaluated as the graph changes). Eliminating
+    a vertex connects each of its predecessors to each of its successors with the
+    product of the two edge labels, accumulated onto any existing edge.
+
+    If ``symbolic`` is False only the sparsity pattern is updated. Returns the
+    number of edge label multiplications performed.
+    """
+
+    heap = [(key(v, preds, succs), v) for v in intermediates]
+    heapq.heapify(heap)
+    remaining = set(intermediates)
+    count = 0
+
+    while heap:
+        k, v = heapq.heappop(heap)
+        if v not in remaining:
+            continue
+        if (current := key(v, preds, succs)) != k:
+            heapq.heappush(heap, (current, v))
+            continue
+
+        neighbours = [*preds[v], *succs[v]]
+        for p, a in preds[v].items():
+            for s, b in succs[v].items():
+                count += 1
+                if symbolic:
+                    label = succs[p].get(s)
+                    value = a * b if label is None else label + a * b
+                else:
+                    value = None
+                succs[p][s] = value
+                preds[s][p] = value
+
+        for p in preds[v]:
+            del succs[p][v]
+        for s in succs[v]:
+            del preds[s][v]
+        del preds[v], succs[v]
+        remaining.discard(v)
+
+        for u in neighbours:
+            if u in remaining:
+                heapq.heappush(heap, (key(u, preds, succs), u))
+
+    return count
+
+
+def _pattern(adjacency):
+    """
+    Copy the sparsity pattern of an adjacency dictionary, dropping the labels.
+    """
+    return {v: dict.fromkeys(adj) for v, adj in adjacency.items()}
+
+
+def jacobian_vertex_elimination(expr, wrt, order='markowitz', return_counts=False):
+    r"""
+    Returns the Jacobian matrix produced by vertex elimination on the
+    linearized computational graph of ``expr``.
+
+    Explanation
+    ===========
+
+    Forward and reverse accumulation are the two extreme orders of eliminating
+    the intermediate vertices of a computational graph. This function builds the
+    linearized graph from the CSE replacements, with the local partial derivatives
+    as edge labels, and eliminates the intermediate vertices in the order chosen
+    by a pluggable heuristic (cross-country elimination). Once only the variables
+    in ``wrt`` and the outputs are left, the edge labels are the entries of the
+    Jacobian, which are then back-substituted.
+
+    The default Markowitz heuristic greedily eliminates the vertex with the
+    fewest predecessor-successor pairs, which often needs far fewer symbolic
+    multiplications than either pure forward or pure reverse mode.
+
+    Derivative terms are handled as in ``forward_jacobian``, through
+    ``_postprocess``. The NaN handling of ``forward_jacobian`` is not reproduced:
+    local partials which are ``nan`` or infinite are combined with SymPy's own
+    arithmetic, so the entries they reach may differ from the ones of
+    ``forward_jacobian``.
+
+    Parameters
+    ==========
+
+    expr : Matrix
+        The vector to be differentiated.
+
+    wrt : Matrix, list, or tuple
+        The vector with respect to which to do the differentiation. Can be a matrix or an iterable of variables.
+
+    order : str or callable, optional
+        The elimination heuristic, one of ``'markowitz'``, ``'forward'`` and
+        ``'reverse'``, or a callable ``key(v, preds, succs)`` returning the priority
+        of vertex ``v`` (lower is eliminated first). Default is ``'markowitz'``.
+
+    return_counts : bool, optional
+        If True, also return a dictionary with the number of multiplications needed
+        by the forward and reverse orders and by the selected one (keyed by its
+        name, or ``'custom'`` for a callable). Default is False.
+
+    """
+
+    if not isinstance(expr, MatrixBase):
+        raise TypeError("``expr`` must be of matrix type")
+
+    if not isinstance(wrt, (MatrixBase, list, tuple)):
+        raise TypeError("``wrt`` must be an iterable of variables")
+
+    key = ORDERINGS[order] if isinstance(order, str) else order
+
+    replacements, reduced_expr = cse(expr)
+    replacements, reduced_expr = _postprocess(replacements, reduced_expr)
+    reduced_expr = list(reduced_expr[0])
+    wrt = list(wrt)
+
+    l_wrt, l_sub, l_red = len(wrt), len(replacements), len(reduced_expr)
+    intermediates = range(l_wrt, l_wrt + l_sub)
+
+    preds, succs = _linearized_graph(replacements, reduced_expr, wrt)
+
+    counts = {}
+    if return_counts:
+        for name in ('forward', 'reverse'):
+            counts[name] = _eliminate(_pattern(preds), _pattern(succs), intermediates,
+                                      ORDERINGS[name], symbolic=False)
+
+    name = order if isinstance(order, str) else 'custom'
+    counts[name] = _eliminate(preds, succs, intermediates, key)
+
+    J = {(v - l_wrt - l_sub, u): label
+         for v in range(l_wrt + l_sub, l_wrt + l_sub + l_red)
+         for u, label in preds[v].items()}
+
+    if replacements:
+        rep_index = {rep_sym: i for i, (rep_sym, _) in enumerate(replacements)}
+        precomputed_fs = [sub_expr.free_symbols for _, sub_expr in replacements]
+        required = _required_replacements(J.values(), rep_index, precomputed_fs)
+        sub_rep = _expand_replacements(required, replacements, precomputed_fs)
+        J = {key: value.xreplace(sub_rep) for key, value in J.items()}
+
+    J = SparseMatrix(l_red, l_wrt, J)
+    J = expr.__class__(J)
+
+    if return_counts:
+        return J, counts
+
+    return J
@@ -0,0 +1,84 @@
+"""Module for vectorised evaluation of linearized systems over operating points."""
+
+import numpy as np
+from sympy import cse, lambdify, Matrix, MatrixBase
+
+
+def linearization_sweep(A, B, args, modules='numpy'):
+    r"""
+    Returns a NumPy-vectorised function evaluating the state and input matrices
+    of a linearized system over many operating points.
+
+    Explanation
+    ===========
+
+    Checking or studying the output of ``KanesMethod.linearize`` usually means
+    substituting the operating point, e.g. the forward speed ``v`` of a bicycle,
+    into ``A`` and ``B`` in a Python loop, which repeats the symbolic work at every
+    value. Here ``A`` and ``B`` are run through one combined ``cse`` and compiled
+    once, so that the subexpressions they share are evaluated once per batch of
+    operating points.
+
+    The returned function takes an array of operating points, of shape ``(N,)``
+    for a single argument or ``(N, len(args))``, and returns the arrays of ``A``
+    and ``B``, of shapes ``(N, n, n)`` and ``(N, n, p)``. With
+    ``eigenvalues=True`` it also returns the eigenvalues of every ``A``, of shape
+    ``(N, n)``, computed in a single batched call.
+
+    Parameters
+    ==========
+
+    A : Matrix
+        The state matrix, with every numeric parameter already substituted.
+
+    B : Matrix
+        The input matrix, with every numeric parameter already substituted. Can be
+        empty.
+
+    args : Symbol, or list of Symbols
+        The symbols describing the operating point, in order. Every free symbol
+        of ``A`` and ``B`` must be included.
+
+    modules : str, optional
+        The ``lambdify`` module to use. Default is ``'numpy'``.
+
+    """
+
+    if not isinstance(A, MatrixBase) or not isinstance(B, MatrixBase):
+        raise TypeError("``A`` and ``B`` must be of matrix type")
+
+    args = list(args) if isinstance(args, (list, tuple, MatrixBase)) else [args]
+    missing = (A.free_symbols | B.free_symbols) - set(args)
+    if missing:
+        raise ValueError(f"``args`` does not include {missing}")
+
+    # Only the nonzero entries are compiled, sharing one set of subexpressions
+    A_dok = A.todok()
+    B_dok = B.todok()
+    outputs = list(A_dok.values()) + list(B_dok.values())
+
+    replacements, reduced = cse(Matrix(outputs)) if outputs else ([], [Matrix([])])
+    func = lambdify(args, list(reduced[0]), modules=modules,
+                    cse=lambda exprs: (replacements, exprs))
+
+    A_keys, B_keys = list(A_dok), list(B_dok)
+
+    def sweep(points, eigenvalues=False):
+        points = np.asarray(points, dtype=float).reshape(-1, len(args))
+        N = points.shape[0]
+        values = func(*points.T)
+
+        A_num = np.zeros((N, *A.shape))
+        for (i, j), value in zip(A_keys, values):
+            A_num[:, i, j] = value
+
+        B_num = np.zeros((N, *B.shape))
+        for (i, j), value in zip(B_keys, values[len(A_keys):]):
+            B_num[:, i, j] = value
+
+        if eigenvalues:
+            return A_num, B_num, np.linalg.eigvals(A_num)
+
+        return A_num, B_num
+
+    return sweep
@@ -1,10 +1,53 @@
-from benchmark.benchmark import run_benchmark_pendulum
-from benchmark.benchmark import run_benchmark_bicycle
-from benchmark.benchmark import run_benchmark_linearize
+import argparse
 
+from benchmark import registry
 
-run_benchmark_pendulum(num_runs=5, sizes=tuple(range(1, 12)))
-#run_benchmark_bicycle(1)
-#run_benchmark_linearize(5)
 
+parser = argparse.ArgumentParser(description="Run the Jacobian benchmarks.")
+parser.add_argument('--model', choices=['pendulum', 'bicycle', 'linearize', 'import'],
+                    default='pendulum', help="the benchmark to run")
+parser.add_argument('--sizes', type=int, nargs='+', default=list(range(1, 12)),
+                    help="number of links of the pendulum model")
+parser.add_argument('--implementations', nargs='+', choices=list(registry.REGISTRY),
+                    metavar='NAME', help="implementations to run, see --list")
+parser.add_argument('--repeats', type=int, default=5, help="number of timed runs")
+parser.add_argument('--workers', type=int,
+                    help="worker processes for the implementations supporting them")
+parser.add_argument('--output', help="results file, by default one per model in data/")
+parser.add_argument('--list', action='store_true',
+                    help="list the registered implementations, their modules and capabilities")
+parser.add_argument('--profile', action='store_true',
+                    help="profile each implementation and size, saving the profiles and "
+                         "hot-function reports in data/profiles")
+parser.add_argument('--sampling', action='store_true',
+                    help="with --profile, also run a sampling profiler and save the "
+                         "collapsed stacks for flamegraphs")
+args = parser.parse_args()
 
+if args.list:
+    # Nothing is imported here, implementations which can't be imported are only
+    # reported when selected
+    for impl in registry.REGISTRY.values():
+        capabilities = ', '.join(k for k, v in impl.capabilities().items() if v)
+        print(f"{impl.name} ({impl.target}): {capabilities or '-'}")
+    raise SystemExit
+
+# The harness is imported here, so that --list and --help stay fast
+from benchmark import benchmark
+
+output = {'filename': args.output} if args.output else {}
+
+if args.model == 'pendulum':
+    benchmark.run_benchmark_pendulum(num_runs=args.repeats, sizes=tuple(args.sizes),
+                                     profile=args.profile, sampling=args.sampling,
+                                     implementations=args.implementations,
+                                     workers=args.workers, **output)
+elif args.model == 'bicycle':
+    benchmark.run_benchmark_bicycle(num_runs=args.repeats, profile=args.profile,
+                                    sampling=args.sampling, implementations=args.implementations,
+                                    workers=args.workers, **output)
+elif args.model == 'linearize':
+    benchmark.run_benchmark_linearize(num_runs=args.repeats, implementations=args.implementations,
+                                      workers=args.workers, **output)
+elif args.model == 'import':
+    benchmark.run_benchmark_import(num_runs=args.repeats, **output)
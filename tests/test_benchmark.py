@@ -0,0 +1,136 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sympy import Add, Basic, Matrix, MatrixBase, cse, symbols, sin, cos
+from sympy.simplify import cse_main
+from benchmark.instrumentation import OperationCounter, _subclasses
+from benchmark.metrics import expression_metrics, dag_metrics, jacobian_metrics
+from benchmark.compare import compare, load_records, main, permutation_test
+
+
+def _attributes(classes):
+    # The attributes patched by OperationCounter
+    names = ('diff', 'xreplace', 'free_symbols', '__new__')
+    return ({(cls, name): cls.__dict__.get(name) for cls in classes for name in names},
+            cse_main.cse)
+
+
+def test_operation_counter():
+    x, y = symbols('x y')
+    classes = _subclasses(Basic) | _subclasses(MatrixBase)
+    before = _attributes(classes)
+
+    with OperationCounter() as counter:
+        Add(x, y, evaluate=False)
+        Matrix([x, y])
+        (x * y).xreplace({x: y})
+
+    with OperationCounter() as counter_cse:
+        cse(Matrix([sin(x + y), (x + y) ** 2]))
+
+    counts = counter.as_dict()
+    print(counts, counter_cse.as_dict())
+
+    # Each primitive called once at the top level is counted once
+    assert counts['Matrix']['calls'] == 1
+    assert counts['xreplace']['calls'] == 1
+    assert counts['Add']['calls'] >= 1
+    assert counts['cse']['calls'] == 0
+    assert counter_cse.counts['cse']['calls'] == 1
+
+    # The patched attributes are restored
+    assert _attributes(classes) == before
+
+
+def test_operation_counter_exception():
+    x = symbols('x')
+    classes = _subclasses(Basic) | _subclasses(MatrixBase)
+    before = _attributes(classes)
+
+    with pytest.raises(ZeroDivisionError):
+        with OperationCounter() as counter:
+            x.diff(x)
+            1 / 0
+
+    assert counter.counts['diff']['calls'] >= 1
+    assert _attributes(classes) == before
+
+
+def test_expression_metrics():
+    x, y = symbols('x y')
+    expr = Matrix([x + y, sin(x + y)])
+
+    metrics = expression_metrics(expr, 'input')
+
+    assert metrics == {'input_count_ops': 3, 'input_nodes': 7}
+    assert dag_metrics(expr) == {'cse_replacements': 1, 'dag_nodes': 6}
+
+
+def test_jacobian_metrics():
+    x, y = symbols('x y')
+    J = Matrix([[1, 0], [cos(x + y), cos(x + y)]])
+
+    metrics = jacobian_metrics(J, 2.0, 10)
+
+    # The repeated cos(x + y) is counted once in the DAG size
+    assert metrics == {'jacobian_nnz': 3, 'output_count_ops': 4, 'output_nodes': 10,
+                       'output_dag_nodes': 6, 'dag_nodes_per_second': 5.0}
+
+
+def _results(filename, times, workers=None):
+    with open(filename, 'w') as f:
+        json.dump([{'implementation': 'forward_jacobian_final', 'model': 'pendulum',
+                    'workers': workers, 'input_size': 2, 'total_time': float(np.mean(times)),
+                    'times': times}], f)
+    return str(filename)
+
+
+def test_compare(tmp_path):
+    times = [1.0, 1.1, 0.9, 1.05, 0.95, 1.0, 1.02, 0.98]
+    shifted = [t * 1.5 for t in times]
+
+    # An identical pair is not a regression
+    baseline = _results(tmp_path / 'baseline.json', times)
+    assert main([baseline, _results(tmp_path / 'same.json', times)]) == 0
+
+    # A clear slow-down sets the exit code
+    assert main([baseline, _results(tmp_path / 'slower.json', shifted)]) == 1
+
+    # Runs with different numbers of workers are not compared
+    parallel = _results(tmp_path / 'parallel.json', times, workers=4)
+    assert main([parallel, _results(tmp_path / 'slower_parallel.json', shifted, workers=2)]) == 0
+    assert compare(load_records(baseline), load_records(parallel))[0] == []
+
+
+def test_permutation_test():
+    rng = np.random.default_rng(0)
+    a, b = rng.normal(1, 0.1, 20), rng.normal(2, 0.1, 20)
+
+    # Enumerated splits give the exact p-value, which counts the observed split
+    assert permutation_test(a[:4], a[:4]) == 1.0
+    assert permutation_test(a[:4], b[:4]) == pytest.approx(2 / 70)
+
+    # Random splits never give a p-value below 1/(n + 1)
+    p_value = permutation_test(a, b, max_permutations=999)
+    assert p_value == pytest.approx(1 / 1000)
+    assert 0 < permutation_test(a, a + 0.05, max_permutations=999) <= 1
+
+
+def test_main_list():
+    # Listing the implementations imports none of them
+    code = ("import runpy, sys\n"
+            "sys.argv = ['main.py', '--list']\n"
+            "try:\n"
+            "    runpy.run_path('main.py')\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "print(sorted(m for m in sys.modules if m.startswith('implementations')))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=Path(__file__).parents[1],
+                            capture_output=True, text=True, check=True)
+
+    assert 'forward_jacobian_final (implementations.forward_jacobian_final' in result.stdout
+    assert result.stdout.splitlines()[-1] == '[]'
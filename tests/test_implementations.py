@@ -1,16 +1,36 @@
 import pytest
-from sympy import Matrix, simplify
+import numpy as np
+from functools import partial
+from sympy import cse, Float, Matrix, SparseMatrix, QQ, Rational, simplify, symbols, sin, cos, exp, hessian, lambdify, Derivative, Dummy, Function
 from benchmark.models import generate_input_pendulum
 from benchmark.models import derivative_example
-
-from implementations.forward_jacobian_final import forward_jacobian
-from implementations.forward_jacobian_sdm import forward_jacobian_sdm
+from benchmark.models import generate_input_pendulum_matrices
+from benchmark.models import jacobian_method
+from benchmark.instrumentation import OperationCounter
+from sympy.physics.mechanics import dynamicsymbols
+from sympy.physics.mechanics.models import n_link_pendulum_on_cart
+
+from implementations.forward_jacobian_final import forward_jacobian, forward_jacobians, iter_jacobian_rows
+from implementations.forward_jacobian_final import forward_jacobian_many
+from implementations.forward_jacobian_final import _forward_jacobian_core, _back_substitute
+from implementations.forward_jacobian_final import _forward_jacobian_norm_in_dag_out
+from implementations.forward_jacobian_columns import forward_jacobian_columns
+from implementations.forward_jacobian_blocks import forward_jacobian_blocks
+from implementations.forward_jacobian_sdm import forward_jacobian_sdm, _split
 from implementations.forward_jacobian_ric2 import forward_jacobian_ric2
 from implementations.forward_jacobian_ric3 import forward_jacobian_ric3
 from implementations.forward_jacobian_ric4 import forward_jacobian_ric4
-from implementations.forward_jacobian_sdm_non_exraw import forward_jacobian_sdm_non_exraw
 from implementations.forward_jacobian_sam import forward_jacobian_sam
 from implementations.jacobian_classic import jacobian_classic
+from implementations.jacobian_vertex_elimination import jacobian_vertex_elimination
+from implementations.jacobian_vertex_elimination import _linearized_graph, _eliminate, _pattern, ORDERINGS
+from implementations.jacobian_products import jvp, vjp
+from implementations.forward_hessian import forward_hessians
+from implementations.jacobian_session import JacobianSession
+from implementations.jacobian_cache import cached, JacobianCache
+from implementations.jacobian_lambdify import lambdify_jacobian
+from implementations.jacobian_dual import dual_jacobian
+from implementations.linearization_sweep import linearization_sweep
 from implementations.jacobian_protosym import jacobian_protosym
 from implementations.jacobian_symengine import jacobian_symengine
 
@@ -20,6 +40,8 @@ def setup_inputs(n = 4):
     return generate_input_pendulum(n)
 
 def test_forward_jacobian_sdm_non_exraw(setup_inputs):
+    forward_jacobian_sdm_non_exraw = pytest.importorskip(
+        'implementations.forward_jacobian_sdm_non_exraw').forward_jacobian_sdm_non_exraw
     expr, wrt = setup_inputs
 
     # Compute the Jacobian using each implementation
@@ -47,6 +69,204 @@ def test_forward_jacobian_final(setup_inputs):
     # Check that all Jacobians are the same
     assert diff == Matrix.zeros(*diff.shape)
 
+def test_forward_jacobian_final_output(setup_inputs):
+    expr, wrt = setup_inputs
+    jacobian_cla = jacobian_classic(expr, wrt)
+
+    # Every container holds the same entries
+    for output in ('sparse', 'dense', 'domainmatrix'):
+        jacobian_final = forward_jacobian(expr, wrt, output=output)
+        if output == 'domainmatrix':
+            jacobian_final = jacobian_final.to_Matrix()
+
+        diff = simplify(jacobian_final - jacobian_cla)
+        assert diff == Matrix.zeros(*diff.shape)
+
+    dok = forward_jacobian(expr, wrt, output='dok')
+    assert all(simplify(value - jacobian_cla[key]) == 0 for key, value in dok.items())
+    assert all(key in dok for key, value in jacobian_cla.todok().items() if simplify(value) != 0)
+
+    with pytest.raises(ValueError):
+        forward_jacobian(expr, wrt, output='array')
+
+
+def test_forward_jacobian_final_spill(setup_inputs):
+    expr, wrt = setup_inputs
+
+    # Spill every row which is not consumed by the next subexpression
+    jacobian_spill = forward_jacobian(expr, wrt, spill_after=1)
+    jacobian_cla = jacobian_classic(expr, wrt)
+
+    diff = simplify(jacobian_spill - jacobian_cla)
+
+    print(diff)
+
+    # Check that all Jacobians are the same
+    assert diff == Matrix.zeros(*diff.shape)
+
+def test_forward_jacobian_final_parallel(setup_inputs):
+    expr, wrt = setup_inputs
+
+    # Compute the local partials in a small process pool
+    jacobian_parallel = forward_jacobian(expr, wrt, workers=2, chunksize=4)
+    jacobian_cla = jacobian_classic(expr, wrt)
+
+    diff = simplify(jacobian_parallel - jacobian_cla)
+
+    print(diff)
+
+    # Check that all Jacobians are the same
+    assert diff == Matrix.zeros(*diff.shape)
+
+
+def test_forward_jacobian_final_params(setup_inputs):
+    expr, wrt = setup_inputs
+
+    # Fold the masses and lengths, keeping them rational
+    params = {w: Rational(k + 2, 3) for k, w in enumerate(wrt)
+              if w.name[0] in 'ml'}
+    remaining = Matrix([w for w in wrt if w not in params])
+
+    jacobian_folded = forward_jacobian(expr, wrt, params=params)
+    jacobian_cla = jacobian_classic(expr.xreplace(params), remaining)
+
+    diff = simplify(jacobian_folded - jacobian_cla)
+
+    print(diff)
+
+    # Check that all Jacobians are the same
+    assert diff == Matrix.zeros(*diff.shape)
+
+def test_forward_jacobian_final_params_linearize():
+    # Linearize the pendulum on a cart with the parameters folded into every Jacobian
+    KM = n_link_pendulum_on_cart(2, cart_force=True)
+    A, B, _ = KM.linearize(A_and_B=True)
+    t = dynamicsymbols._t
+    params = {s: Rational(k + 2, 3) for k, s in
+              enumerate(sorted(A.free_symbols - {t}, key=str))}
+
+    KM_params = n_link_pendulum_on_cart(2, cart_force=True)
+    with jacobian_method(partial(forward_jacobian, params=params)):
+        A_params, B_params, _ = KM_params.linearize(A_and_B=True)
+
+    diff_A = simplify(A_params - A.xreplace(params))
+    diff_B = simplify(B_params - B.xreplace(params))
+
+    print(diff_A, diff_B)
+
+    # Check that the parameters were folded and that the matrices are the same
+    assert A_params.free_symbols <= {t}
+    assert diff_A == Matrix.zeros(*diff_A.shape)
+    assert diff_B == Matrix.zeros(*diff_B.shape)
+
+def test_forward_jacobians():
+    exprs, wrt = generate_input_pendulum_matrices(3)
+
+    # Rectangular matrices are differentiated as their row-major vector of elements
+    jacobians = forward_jacobians(exprs, wrt)
+
+    for expr, jacobian_fwd in zip(exprs, jacobians):
+        jacobian_cla = jacobian_classic(expr.reshape(len(expr), 1), wrt)
+        diff = simplify(jacobian_fwd - jacobian_cla)
+
+        print(diff)
+
+        assert diff == Matrix.zeros(*diff.shape)
+
+    # forward_jacobian only takes vectors
+    with pytest.raises(TypeError):
+        forward_jacobian(exprs[0], wrt)
+
+
+def test_forward_jacobian_many():
+    x, y, z = symbols('x y z')
+    expr, wrt = generate_input_pendulum(2)
+    problems = [
+        (expr, wrt),
+        (2 * expr, wrt),
+        (Matrix([[x * sin(y), z], [cos(x * y), y ** 2]]), [x, y]),
+        (Matrix([x + y]), Matrix([z])),
+        (Matrix([x * y, sin(x * y)]), [y, x, y]),
+    ]
+
+    # The whole batch goes through a single cse
+    with OperationCounter() as counter:
+        jacobians = forward_jacobian_many(problems)
+    assert counter.counts['cse']['calls'] == 1
+
+    for (expr, wrt), jacobian_fwd in zip(problems, jacobians):
+        jacobian_cla = jacobian_classic(expr.reshape(len(expr), 1), wrt)
+        diff = simplify(jacobian_fwd - jacobian_cla)
+
+        assert diff == Matrix.zeros(*diff.shape)
+
+
+def test_iter_jacobian_rows(setup_inputs):
+    expr, wrt = setup_inputs
+
+    # Stack the streamed row blocks back into a single matrix
+    blocks = [block for _, block in iter_jacobian_rows(expr, wrt, chunk=3)]
+    jacobian_rows = Matrix.vstack(*blocks)
+    jacobian_cla = jacobian_classic(expr, wrt)
+
+    diff = simplify(jacobian_rows - jacobian_cla)
+
+    print(diff)
+
+    # Check that all Jacobians are the same
+    assert diff == Matrix.zeros(*diff.shape)
+
+def test_forward_jacobian_columns(setup_inputs):
+    expr, wrt = setup_inputs
+
+    # Compute the Jacobian using each implementation
+    jacobian_columns = forward_jacobian_columns(expr, wrt, blocks=3, workers=2)
+    jacobian_cla = jacobian_classic(expr, wrt)
+
+    diff = simplify(jacobian_columns - jacobian_cla)
+
+    print(diff)
+
+    # Check that all Jacobians are the same
+    assert diff == Matrix.zeros(*diff.shape)
+
+    # An empty ``wrt`` gives an empty Jacobian without starting a pool
+    assert forward_jacobian_columns(expr, []).shape == (len(expr), 0)
+
+def test_forward_jacobian_blocks(setup_inputs):
+    expr, wrt = setup_inputs
+
+    # Compute the Jacobian using each implementation
+    jacobian_blocks, stats = forward_jacobian_blocks(expr, wrt, return_stats=True)
+    jacobian_cla = jacobian_classic(expr, wrt)
+
+    diff = simplify(jacobian_blocks - jacobian_cla)
+
+    print(diff, stats)
+
+    # Check that all Jacobians are the same
+    assert diff == Matrix.zeros(*diff.shape)
+    assert stats['block_work'] <= stats['dense_work']
+
+
+def test_forward_jacobian_blocks_decoupled():
+    # Two decoupled parts, sharing subexpressions within each part, and a constant
+    x, y, z, w = symbols('x y z w')
+    expr = Matrix([sin(x * y) + x * y, cos(x * y) * y, sin(z + w) * (z + w), (z + w) ** 2, 3])
+    wrt = [x, y, z, w]
+
+    jacobian_blocks, stats = forward_jacobian_blocks(expr, wrt, return_stats=True)
+    jacobian_cla = jacobian_classic(expr, wrt)
+
+    diff = simplify(jacobian_blocks - jacobian_cla)
+
+    print(diff, stats)
+
+    assert diff == Matrix.zeros(*diff.shape)
+    assert stats['blocks'] == 2
+    assert stats['block_shapes'] == [(2, 2), (2, 2)]
+    assert stats['block_work'] < stats['dense_work']
+
 def test_forward_jacobian_sdm(setup_inputs):
     expr, wrt = setup_inputs
 
@@ -62,6 +282,31 @@ def test_forward_jacobian_sdm(setup_inputs):
     assert diff == Matrix.zeros(*diff.shape)
 
 
+def test_forward_jacobian_sdm_domains(setup_inputs):
+    expr, wrt = setup_inputs
+    jacobian_cla = jacobian_classic(expr, wrt)
+
+    for domain in ('poly', 'frac'):
+        jacobian_sdm = forward_jacobian_sdm(expr, wrt, domain=domain)
+        diff = simplify(jacobian_sdm - jacobian_cla)
+        assert diff == Matrix.zeros(*diff.shape)
+
+    # Entries with floats or denominators are kept in EXRAW
+    x, y, z = symbols('x y z')
+    expr = Matrix([sin(x * y) ** 2 * x + Float(0.5) * sin(x * y) * z, (sin(x * y) + z) / (x + 1)])
+    jacobian_cla = jacobian_classic(expr, [x, y, z])
+
+    for domain in ('poly', 'frac'):
+        jacobian_sdm = forward_jacobian_sdm(expr, [x, y, z], domain=domain)
+        diff = simplify(jacobian_sdm - jacobian_cla)
+        assert diff == Matrix.zeros(*diff.shape)
+
+    # Entries which fail to convert are kept in EXRAW, even first in their row
+    P, E = _split({(0, 0): y, (0, 1): x}, QQ[x], {x, y})
+    assert P == {0: {1: QQ[x].from_sympy(x)}}
+    assert E == {0: {0: y}}
+
+
 def test_forward_jacobian_ric2(setup_inputs):
     expr, wrt = setup_inputs
 
@@ -135,6 +380,271 @@ def test_forward_jacobian_sam(setup_inputs):
     assert diff == Matrix.zeros(*diff.shape)
 
 
+def test_jacobian_vertex_elimination(setup_inputs):
+    expr, wrt = setup_inputs
+
+    # Compute the Jacobian using each implementation
+    jacobian_ve, counts = jacobian_vertex_elimination(expr, wrt, order='markowitz', return_counts=True)
+    jacobian_cla = jacobian_classic(expr, wrt)
+
+    diff = simplify(jacobian_ve - jacobian_cla)
+
+    print(diff, counts)
+
+    # Check that all Jacobians are the same
+    assert diff == Matrix.zeros(*diff.shape)
+    assert set(counts) == {'forward', 'reverse', 'markowitz'}
+
+    # Every ordering gives the same Jacobian
+    for order in ('forward', 'reverse'):
+        diff = simplify(jacobian_vertex_elimination(expr, wrt, order=order) - jacobian_cla)
+        assert diff == Matrix.zeros(*diff.shape)
+
+
+def test_vertex_elimination_counts():
+    # x, y, z -> a -> b -> c -> three outputs: forward and reverse modes both need
+    # 3 + 3 + 9 multiplications, Markowitz eliminates b first and needs 1 + 3 + 9
+    x, y, z, a, b, c = symbols('x y z a b c')
+    replacements = [(a, x + y + z), (b, sin(a)), (c, exp(b))]
+    reduced_expr = [c ** 2, c ** 3, sin(c)]
+    preds, succs = _linearized_graph(replacements, reduced_expr, [x, y, z])
+
+    counts = {name: _eliminate(_pattern(preds), _pattern(succs), range(3, 6), key, symbolic=False)
+              for name, key in ORDERINGS.items()}
+
+    assert counts == {'forward': 15, 'reverse': 15, 'markowitz': 13}
+
+
+def test_jvp_vjp(setup_inputs):
+    expr, wrt = setup_inputs
+    v = Matrix(symbols(f'v0:{len(wrt)}'))
+    w = Matrix(symbols(f'w0:{len(expr)}'))
+
+    # Compare the products with the ones of the classic Jacobian
+    jacobian_cla = jacobian_classic(expr, wrt)
+
+    diff_jvp = simplify(jvp(expr, wrt, v) - jacobian_cla * v)
+    diff_vjp = simplify(vjp(expr, wrt, w) - (w.T * jacobian_cla).T)
+
+    print(diff_jvp, diff_vjp)
+
+    # Check that all products are the same
+    assert diff_jvp == Matrix.zeros(*diff_jvp.shape)
+    assert diff_vjp == Matrix.zeros(*diff_vjp.shape)
+
+
+def test_jvp_vjp_symbol_collisions():
+    x, y, x0, dx0, ax0 = symbols('x y x0 dx0 ax0')
+    expr = Matrix([(x + y)**2, (x + y)**3])
+    wrt = [x, y]
+
+    # Vectors using the names of the replacement, tangent and adjoint symbols
+    v = Matrix([dx0, x0])
+    w = Matrix([ax0, x0])
+    jacobian_cla = jacobian_classic(expr, wrt)
+
+    diff_jvp = simplify(jvp(expr, wrt, v) - jacobian_cla * v)
+    diff_vjp = simplify(vjp(expr, wrt, w) - (w.T * jacobian_cla).T)
+
+    assert diff_jvp == Matrix.zeros(*diff_jvp.shape)
+    assert diff_vjp == Matrix.zeros(*diff_vjp.shape)
+
+
+@pytest.mark.parametrize('n', [2, 3])
+def test_forward_hessians(n):
+    expr, wrt = generate_input_pendulum(n)
+
+    # Compare each Hessian with the classic sympy one
+    hessians = forward_hessians(expr, wrt)
+
+    for e, hessian_fwd in zip(expr, hessians):
+        diff = simplify(hessian_fwd - hessian(e, wrt))
+
+        print(diff)
+
+        assert diff == Matrix.zeros(*diff.shape)
+
+
+def test_forward_jacobian_core_columns(setup_inputs):
+    expr, wrt = setup_inputs
+    columns = [range(i % len(wrt), len(wrt)) for i in range(len(expr))]
+
+    # Only the requested columns of every row are computed
+    replacements, reduced_expr = cse(expr)
+    replacements, J, precomputed_fs = _forward_jacobian_core(replacements, reduced_expr, wrt,
+                                                             columns=columns, output='dok')
+    J = _back_substitute(replacements, J, precomputed_fs)
+    J = Matrix(len(expr), len(wrt), lambda i, j: J.get((i, j), 0))
+    jacobian_cla = jacobian_classic(expr, wrt)
+    expected = Matrix(len(expr), len(wrt),
+                      lambda i, j: jacobian_cla[i, j] if j in columns[i] else 0)
+
+    diff = simplify(J - expected)
+
+    assert diff == Matrix.zeros(*diff.shape)
+
+
+def test_jacobian_session(setup_inputs):
+    expr, wrt = setup_inputs
+
+    # Start from the first columns, then append the others and change an output
+    session = JacobianSession(expr, wrt[:4])
+    session.add_wrt(wrt[4:])
+    new_expr = Matrix(expr)
+    new_expr[1] = 2 * expr[1] + expr[0] * expr[2]
+    session.replace_output(1, new_expr[1])
+
+    jacobian_session = session.jacobian()
+    jacobian_cla = jacobian_classic(new_expr, wrt)
+
+    diff = simplify(jacobian_session - jacobian_cla)
+
+    print(diff, session.timings)
+
+    # Check that all Jacobians are the same
+    assert diff == Matrix.zeros(*diff.shape)
+    assert [op for op, _ in session.timings] == ['init', 'add_wrt', 'replace_output']
+
+
+def test_jacobian_session_symbol_collisions():
+    x, y, x0, x3 = symbols('x y x0 x3')
+    expr = Matrix([sin(x + y)**2 + cos(x + y), (x*y + 1)**2 + (x*y + 1)**3 + x*y])
+
+    # The new output and variables use the names of replacement symbols
+    session = JacobianSession(expr, [x, y])
+    session.add_wrt([x0, x3])
+    new_expr = Matrix(expr)
+    new_expr[1] = x0 * (x - y)**2 + x3 * (x - y)**3
+    session.replace_output(1, new_expr[1])
+
+    diff = simplify(session.jacobian() - jacobian_classic(new_expr, [x, y, x0, x3]))
+
+    assert diff == Matrix.zeros(*diff.shape)
+
+
+def test_jacobian_cache(setup_inputs, tmp_path):
+    expr, wrt = setup_inputs
+
+    # The first call is a miss, the second one is read back from disk
+    cache = JacobianCache(str(tmp_path))
+    forward_jacobian_cached = cached(forward_jacobian, cache=cache)
+
+    jacobian_miss = forward_jacobian_cached(expr, wrt)
+    jacobian_hit = forward_jacobian_cached(expr, wrt)
+
+    print(cache.stats())
+
+    assert jacobian_hit == jacobian_miss
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Keyword arguments, bound by a partial or passed, are part of the key
+    forward_jacobian_dok = cached(partial(forward_jacobian, output='dok'), cache=cache)
+    jacobian_dok = forward_jacobian_dok(expr, wrt)
+    assert forward_jacobian_dok(expr, wrt) == jacobian_dok
+    assert jacobian_dok == {key: value for key, value in jacobian_miss.todok().items()}
+    assert forward_jacobian_cached(expr, wrt, output='sparse').__class__ == SparseMatrix
+    assert (cache.hits, cache.misses) == (2, 3)
+
+    # The DAG form is stored as well
+    dag_cached = cached(_forward_jacobian_norm_in_dag_out, cache=cache)
+    assert dag_cached(expr, wrt) == dag_cached(expr, wrt)
+
+    # A cache too small for any entry evicts everything
+    cache.max_bytes = 0
+    cached(jacobian_classic, cache=cache)(expr, wrt)
+    assert cache.stats()['entries'] == 0
+
+
+def test_lambdify_jacobian(setup_inputs):
+    expr, wrt = setup_inputs
+    args = [*wrt, *sorted(expr.atoms(Derivative), key=str)]
+    states = np.random.default_rng(0).random((20, len(args)))
+
+    # Evaluate the classic Jacobian one state at a time
+    dummies = {a: Dummy() for a in args if not a.is_Symbol}
+    jacobian_cla = lambdify([dummies.get(a, a) for a in args],
+                            jacobian_classic(expr, wrt).xreplace(dummies))
+    expected = np.array([jacobian_cla(*state) for state in states], dtype=float)
+
+    f, jacobian_num = lambdify_jacobian(expr, wrt, args=args)(states)
+
+    # Evaluate the expression itself by substitution on a few states
+    expected_f = np.array([list(expr.subs(dict(zip(args, state))).evalf())
+                           for state in states[:3]], dtype=float)
+
+    assert f.shape == (20, len(expr))
+    assert np.allclose(f[:3], expected_f)
+    assert np.allclose(jacobian_num, expected)
+
+    # A coordinate must be given even when its derivative is
+    t = symbols('t')
+    q = Function('q')(t)
+    with pytest.raises(ValueError):
+        lambdify_jacobian(Matrix([q * q.diff(t)]), [q.diff(t)])
+
+
+def test_dual_jacobian(setup_inputs):
+    expr, wrt = setup_inputs
+    args = [*wrt, *sorted(expr.atoms(Derivative), key=str)]
+    states = np.random.default_rng(0).random((20, len(args)))
+
+    # Evaluate the expression and the classic Jacobian one state at a time
+    dummies = {a: Dummy() for a in args if not a.is_Symbol}
+    dummy_args = [dummies.get(a, a) for a in args]
+    expr_cla = lambdify(dummy_args, expr.xreplace(dummies))
+    jacobian_cla = lambdify(dummy_args, jacobian_classic(expr, wrt).xreplace(dummies))
+    expected_f = np.array([np.ravel(expr_cla(*state)) for state in states], dtype=float)
+    expected = np.array([jacobian_cla(*state) for state in states], dtype=float)
+
+    f_dual, jacobian_dual = dual_jacobian(expr, wrt, args=args)(states)
+
+    assert np.allclose(f_dual, expected_f)
+    assert np.allclose(jacobian_dual, expected)
+
+    # Symbols missing from args are named
+    l0 = symbols('l0')
+    keep = [k for k, a in enumerate(args) if a != l0]
+    with pytest.raises(ValueError, match='l0'):
+        dual_jacobian(expr, [w for w in wrt if w != l0],
+                      args=[args[k] for k in keep])(states[:, keep])
+
+
+def test_linearization_sweep():
+    v, w = symbols('v w')
+    A = Matrix([[0, 1], [-2*v**2 + sin(w), -v*cos(w)]])
+    B = Matrix([[0], [1 + v]])
+    points = np.random.default_rng(0).random((20, 2))
+
+    A_num, B_num, eigenvalues = linearization_sweep(A, B, [v, w])(points, eigenvalues=True)
+
+    # Compare with substituting each operating point
+    for k, (v_k, w_k) in enumerate(points):
+        A_k = np.array(A.subs({v: v_k, w: w_k}), dtype=float)
+        B_k = np.array(B.subs({v: v_k, w: w_k}), dtype=float)
+        assert np.allclose(A_num[k], A_k)
+        assert np.allclose(B_num[k], B_k)
+        assert np.allclose(np.sort_complex(eigenvalues[k]), np.sort_complex(np.linalg.eigvals(A_k)))
+
+
+def test_linearization_sweep_linearize():
+    # Sweep the linearized pendulum on a cart over its angle
+    KM = n_link_pendulum_on_cart(1, cart_force=True)
+    q0, q1 = KM.q
+    op_point = {q0: 0, **{u: 0 for u in KM.u}, **{u.diff(): 0 for u in KM.u}}
+    A, B, _ = KM.linearize(A_and_B=True, op_point=op_point)
+    theta, g, l0, m0, m1 = symbols('theta g l0 m0 m1')
+    values = {q1: theta, g: 9.81, l0: 0.5, m0: 1.0, m1: 2.0}
+    A, B = A.xreplace(values), B.xreplace(values)
+    points = np.linspace(-1, 1, 5)
+
+    A_num, B_num = linearization_sweep(A, B, theta)(points)
+
+    # Compare with substituting each angle
+    for k, theta_k in enumerate(points):
+        assert np.allclose(A_num[k], np.array(A.subs(theta, theta_k), dtype=float))
+        assert np.allclose(B_num[k], np.array(B.subs(theta, theta_k), dtype=float))
+
+
 def test_jacobian_protosym(setup_inputs):
     expr, wrt = setup_inputs
 